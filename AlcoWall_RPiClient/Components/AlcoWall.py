@@ -1,21 +1,29 @@
 # AlcoWall.py
 
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QMainWindow
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QMainWindow, QStackedLayout
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtCore import QFile, QUrl, Qt, QTimer, Slot
 from PySide6.QtMultimediaWidgets import QVideoWidget
 from PySide6.QtMultimedia import QMediaPlayer
 from PySide6.QtGui import QPixmap
 from Components.VideoWidget import VideoWidget
-from Constants.GENERALCONSTANTS import DEVICE_ID_FILE, PERCENTAGE_OF_SCREEN_WIDTH_THAT_PROXIMITY_SENSOR_TEXT_TAKES
+from Constants.GENERALCONSTANTS import DEVICE_ID_FILE, PERCENTAGE_OF_SCREEN_WIDTH_THAT_PROXIMITY_SENSOR_TEXT_TAKES, FALLBACK_VIDEO_PATH, SWITCH_LATENCY_HISTORY
+from Constants.GENERALCONSTANTS import CAMPAIGN_MANIFEST_REFRESH_INTERVAL
 import threading
+import time
+from collections import deque
 from DatabaseManagement.DataManager import DataManager  # Import the DataManager
+from MediaManagement.AdCache import AdCache
+from MediaManagement.AdIngestPipeline import AdIngestPipeline
+from MediaManagement.AdScheduler import AdScheduler
+from MediaManagement.MediaManifest import MediaManifest
 from PySide6.QtCore import Signal
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel
 
 class AlcoWall(QMainWindow):
     _instance = None
     video_finished = Signal()
+    state_changed = Signal(str)  # Name of the state that was entered
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls, *args, **kwargs)
@@ -28,17 +36,20 @@ class AlcoWall(QMainWindow):
         
         # Initialize variables
         self.device_id = self.read_device_id()
-        self.next_add_url = None
         self.fun_fact = None
 
         self.credit = 0
         self.alcohol_level = -1
+        self.alcohol_samples = None  # SampleRingBuffer of the alcohol sensor once it is running
+        self.expected_peripherals = set()  # Peripherals being initialized in the background
+        self.ready_peripherals = set()
 
         self.service_door_open = False
         self.coins_door_open = False
         self.coin_stuck = False
         
         self.alcohol_level_to_show = 0
+        self.alcohol_baseline = None  # Sensor voltage before the last alcohol check
 
         
 
@@ -64,6 +75,17 @@ class AlcoWall(QMainWindow):
         self._initialized = True
         self.current_state = None
         self.data_manager = DataManager(self.device_id)
+        self.ad_cache = AdCache()
+        self.media_manifest = MediaManifest()
+        self.ad_ingest = AdIngestPipeline(self.ad_cache, self.media_manifest)
+        self.ad_scheduler = AdScheduler()
+        self.prefetch_campaign_ads()
+
+        # Keep the campaign manifest in sync in the background, playback never waits for it
+        self.data_manager.campaign_manifest_signal.connect(self.on_campaign_manifest)
+        self.campaign_manifest_timer = QTimer(self)
+        self.campaign_manifest_timer.timeout.connect(self.data_manager.get_campaign_manifest)
+        self.campaign_manifest_timer.start(CAMPAIGN_MANIFEST_REFRESH_INTERVAL * 1000)
 
     def initialize_video_player(self):
         """Initialize QMediaPlayer and QVideoWidget to replace self.video_widget."""
@@ -73,20 +95,29 @@ class AlcoWall(QMainWindow):
             print("Error: 'backgroundImageLabel' not found in UI.")
             exit(-1)
         
-        # Create a QVideoWidget instance for video playback
-        self.video_widget = QVideoWidget(self)
-
-        # Create a QMediaPlayer instance
-        self.media_player = QMediaPlayer(self)
-
-        # Set the video output to the QVideoWidget
-        self.media_player.setVideoOutput(self.video_widget)
-        self.media_player.mediaStatusChanged.connect(self.on_media_status_changed)
-
-
-        # Optionally, set media source here or elsewhere as needed
-        # Example:
-        # self.media_player.setSource(QUrl.fromLocalFile("path/to/your/video.mp4"))
+        # Two player/sink pairs: one plays while the other preloads the next video,
+        # they are swapped at the end of media so there is no gap between videos.
+        # video_widget contains both sinks and is shown/hidden by the states.
+        self.video_widget = QWidget(self)
+        self.video_stack = QStackedLayout(self.video_widget)
+        self.video_stack.setContentsMargins(0, 0, 0, 0)
+        self.players = []
+        self.sink_widgets = []
+        for index in range(2):
+            sink_widget = QVideoWidget(self.video_widget)
+            player = QMediaPlayer(self)
+            player.setVideoOutput(sink_widget)
+            player.mediaStatusChanged.connect(lambda status, index=index: self.on_media_status_changed(index, status))
+            sink_widget.videoSink().videoFrameChanged.connect(lambda frame, index=index: self.on_video_frame(index))
+            self.video_stack.addWidget(sink_widget)
+            self.players.append(player)
+            self.sink_widgets.append(sink_widget)
+
+        self.active_index = 0
+        self.video_stack.setCurrentWidget(self.sink_widgets[self.active_index])
+        self.preloaded_path = None
+        self.switch_started_at = None
+        self.switch_latencies_ms = deque(maxlen=SWITCH_LATENCY_HISTORY)
 
         # Configure the UI elements related to the video player
         video_container = self.ui.findChild(QWidget, "videoContainer")
@@ -131,18 +162,65 @@ class AlcoWall(QMainWindow):
             main_videos_widget.setLayout(main_videos_widget_layout)
         main_videos_widget_layout.addWidget(self.workingWidget)
 
-    @Slot()
-    def on_media_status_changed(self, status):
-        """Slot to handle media status changes."""
+        # The AlcoholCheck clip is looped for every customer, decode it only once if its frames fit FRAME_CACHE_MAX_BYTES
+        self.workingWidget.cache_video(FALLBACK_VIDEO_PATH)
+
+    @property
+    def media_player(self):
+        """The player that is currently on screen."""
+        return self.players[self.active_index]
+
+    @property
+    def standby_index(self):
+        return 1 - self.active_index
+
+    def on_media_status_changed(self, index, status):
+        """Slot to handle media status changes of both players."""
+        if index == self.standby_index:
+            if status == QMediaPlayer.MediaStatus.LoadedMedia and self.preloaded_path:
+                # Pre-roll: pausing a loaded player decodes and renders its first frame
+                self.players[index].pause()
+            return
+
         print("Media status changed:", status)
         if status == QMediaPlayer.MediaStatus.EndOfMedia:
             print("Video finished.")
+            self.switch_started_at = time.monotonic()
             self.video_finished.emit()
 
-    @Slot(str)
-    def get_ad_url(self, ad_url):
-        if "Error" not in ad_url:
-            self.next_add_url = ad_url
+    def on_video_frame(self, index):
+        """Measures the time from end of media until the next video shows its first new frame."""
+        if index != self.active_index or self.switch_started_at is None:
+            return
+        if self.players[index].playbackState() != QMediaPlayer.PlaybackState.PlayingState:
+            return
+        latency_ms = (time.monotonic() - self.switch_started_at) * 1000
+        self.switch_started_at = None
+        self.switch_latencies_ms.append(latency_ms)
+        print(f"Video switch latency: {latency_ms:.1f} ms")
+
+    def get_switch_latency_stats(self):
+        """Returns last, mean and max video switch latency in milliseconds."""
+        if not self.switch_latencies_ms:
+            return None
+        return dict(
+            last=self.switch_latencies_ms[-1],
+            mean=sum(self.switch_latencies_ms) / len(self.switch_latencies_ms),
+            max=max(self.switch_latencies_ms),
+            count=len(self.switch_latencies_ms),
+        )
+
+    @Slot(dict)
+    def on_campaign_manifest(self, manifest):
+        """Loads a freshly synced campaign manifest and starts fetching ads that are not cached yet."""
+        if self.ad_scheduler.load(manifest):
+            print(f"Campaign manifest updated: {len(self.ad_scheduler.get_ads())} ads")
+        self.prefetch_campaign_ads()
+
+    def prefetch_campaign_ads(self):
+        for ad in self.ad_scheduler.get_ads():
+            if not self.ad_cache.lookup(ad["url"]):
+                self.ad_ingest.request_ad(ad["url"], ad["sha256"])
 
     @Slot(str)
     def get_fun_fact(self, fun_fact):
@@ -176,9 +254,37 @@ class AlcoWall(QMainWindow):
             self.alcohol_level = alcohol_level
 
     def get_alcohol_level(self):
-        """Get the current alcohol level."""
+        """Get the current alcohol level, the newest sensor sample when samples are streamed."""
+        if self.alcohol_samples is not None:
+            latest = self.alcohol_samples.latest()
+            if latest is not None:
+                return float(latest['voltage'])
         return self.alcohol_level
 
+    def expect_peripherals(self, names):
+        """Registers peripherals whose initialization has started."""
+        self.expected_peripherals.update(names)
+
+    def set_peripheral_ready(self, name):
+        self.ready_peripherals.add(name)
+
+    def missing_peripherals(self, names):
+        """Returns the expected peripherals among names that are not initialized yet."""
+        return [name for name in names if name in self.expected_peripherals and name not in self.ready_peripherals]
+
+    def set_alcohol_samples(self, sample_buffer):
+        """Connect the sample ring buffer of the alcohol sensor."""
+        self.alcohol_samples = sample_buffer
+
+    def get_alcohol_window(self, seconds=None, since_ns=None):
+        """
+        Get the sensor samples (t_ns, raw, voltage) of the last `seconds` or since the
+        monotonic timestamp `since_ns`. Returns None if no sensor is streaming.
+        """
+        if self.alcohol_samples is None:
+            return None
+        return self.alcohol_samples.window(seconds, since_ns)
+
     def set_alcohol_level(self, alcohol_level):
         """Set the alcohol level in a thread-safe manner."""
         with threading.Lock():
@@ -219,12 +325,33 @@ class AlcoWall(QMainWindow):
     # For example, to play, pause, stop, etc.
 
     def play_video(self, video_path):
-        """Set the media source and play the video."""
-        if self.media_player:
-            self.media_player.setSource(QUrl.fromLocalFile(video_path))
+        """
+        Play the video. If it was preloaded the standby player is swapped in, its first
+        frame is already rendered, otherwise the source is loaded on the active player.
+        """
+        if not self.media_player:
+            print("Error: Media player not initialized.")
+            return
+
+        if video_path == self.preloaded_path:
+            previous_player = self.media_player
+            self.active_index = self.standby_index
+            self.preloaded_path = None
             self.media_player.play()
+            self.video_stack.setCurrentWidget(self.sink_widgets[self.active_index])
+            previous_player.stop()
         else:
-            print("Error: Media player not initialized.")
+            self.media_player.setSource(QUrl.fromLocalFile(video_path))
+            self.media_player.play()
+
+    def preload_video(self, video_path):
+        """Loads and pre-rolls the video on the standby player so play_video can switch to it instantly."""
+        if video_path == self.preloaded_path:
+            return
+        standby_player = self.players[self.standby_index]
+        standby_player.stop()
+        self.preloaded_path = video_path
+        standby_player.setSource(QUrl.fromLocalFile(video_path))
 
     def pause_video(self):
         """Pause the video playback."""
@@ -0,0 +1,156 @@
+import glob
+import os
+import shutil
+import threading
+import imageio
+import numpy as np
+from Constants.GENERALCONSTANTS import FRAME_CACHE_DIRECTORY, FRAME_CACHE_MAX_BYTES
+
+class FrameCache:
+    """
+    All frames of a short, frequently looped clip decoded once into a uint8 array.
+
+    The array lives in a .npy file on tmpfs that is memory-mapped, so it is built once
+    per boot (also surviving application restarts) and playback only hands out views
+    into it, without decoding or copying.
+    """
+    def __init__(self, video_path, cache_directory=FRAME_CACHE_DIRECTORY, max_bytes=FRAME_CACHE_MAX_BYTES):
+        self.video_path = video_path
+        self.cache_directory = cache_directory if os.path.isdir(cache_directory) else "/tmp"
+        self.max_bytes = max_bytes
+        self.frames = None
+        self.frame_rate = None
+        self.ready = threading.Event()
+
+        stat = os.stat(video_path)
+        self.base_name = os.path.splitext(os.path.basename(video_path))[0]
+        self.cache_path = os.path.join(self.cache_directory, f"alcowall-{self.base_name}-{stat.st_size}-{stat.st_mtime_ns}.npy")
+
+    def build_async(self):
+        """Builds (or reopens) the cache on a background thread."""
+        thread = threading.Thread(target=self.build, daemon=True)
+        thread.start()
+        return thread
+
+    def build(self):
+        """Decodes the clip into the memory-mapped file unless it already exists. Returns True if the cache is usable."""
+        try:
+            self.remove_stale_files()
+            reader = imageio.get_reader(self.video_path)
+            try:
+                self.frame_rate = reader.get_meta_data()['fps']
+                if not os.path.exists(self.cache_path):
+                    if self.estimated_bytes(reader) > self.max_bytes:
+                        # Known not to fit, skip the frame counting pass over the whole clip
+                        print(f"Not caching {self.video_path}: about {self.estimated_bytes(reader) // (1024 * 1024)} MiB of frames")
+                        return False
+                    if not self._decode(reader):
+                        return False
+            finally:
+                reader.close()
+            self.frames = np.load(self.cache_path, mmap_mode='r')
+            self.ready.set()
+            print(f"Frame cache ready for {self.video_path}: {self.frames.shape[0]} frames, {self.frames.nbytes // (1024 * 1024)} MiB")
+            return True
+        except Exception as e:
+            print(f"Error building frame cache for {self.video_path}: {e}")
+            return False
+
+    def remove_stale_files(self):
+        """
+        Removes caches of earlier versions of the clip and leftovers of interrupted
+        decodes, they would otherwise pin RAM until the next reboot. A cache built
+        under a larger FRAME_CACHE_MAX_BYTES is removed as well.
+        """
+        for path in glob.glob(os.path.join(self.cache_directory, f"alcowall-{glob.escape(self.base_name)}-*")):
+            if path == self.cache_path and os.path.getsize(path) <= self.max_bytes:
+                continue
+            try:
+                os.remove(path)
+                print(f"Removed stale frame cache {path}")
+            except OSError as e:
+                print(f"Error removing stale frame cache {path}: {e}")
+
+    def estimated_bytes(self, reader):
+        """Size of the decoded frames from the container duration, 0 if it is not known."""
+        meta_data = reader.get_meta_data()
+        width, height = meta_data['size']
+        duration = meta_data.get('duration') or 0
+        return int(round(duration * meta_data['fps'])) * height * width * 3
+
+    def _decode(self, reader):
+        width, height = reader.get_meta_data()['size']
+        frame_count = reader.count_frames()
+        size_bytes = frame_count * height * width * 3
+        if size_bytes > self.max_bytes or size_bytes > shutil.disk_usage(self.cache_directory).free:
+            print(f"Not caching {self.video_path}: {size_bytes // (1024 * 1024)} MiB of frames does not fit")
+            return False
+
+        temp_path = f"{self.cache_path}.part"
+        frames = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.uint8, shape=(frame_count, height, width, 3))
+        try:
+            decoded = 0
+            for frame in reader:
+                if decoded == frame_count:
+                    break
+                frames[decoded] = frame
+                decoded += 1
+            frames.flush()
+        finally:
+            del frames
+        if decoded < frame_count:
+            # The container overstated the frame count, keep only what was decoded
+            np.save(temp_path, np.load(temp_path, mmap_mode='r')[:decoded])
+            os.replace(f"{temp_path}.npy", temp_path)
+        os.replace(temp_path, self.cache_path)
+        return True
+
+    def player(self, loop=True):
+        """Returns a frame source for VideoWidget with the same interface as FrameDecoder."""
+        return CachedFramePlayer(self, loop)
+
+class CachedFramePlayer:
+    """Steps through a FrameCache, frames are views into the memory-mapped array."""
+    def __init__(self, frame_cache, loop=True):
+        self.frames = frame_cache.frames
+        self.frame_rate = frame_cache.frame_rate
+        self.loop = loop
+        self.index = 0
+        self.sequence_number = 0
+        self.looped = False
+
+    def peek_pts(self):
+        if not self.loop and self.index >= len(self.frames):
+            return None
+        return self.sequence_number / self.frame_rate
+
+    def _advance(self):
+        looped = self.looped
+        self.looped = False
+        frame = self.frames[self.index]
+        self.index += 1
+        self.sequence_number += 1
+        if self.index >= len(self.frames) and self.loop:
+            self.index = 0
+            self.looped = True
+        return frame, looped
+
+    def next_frame(self):
+        if self.peek_pts() is None:
+            return None
+        pts = self.sequence_number / self.frame_rate
+        frame, looped = self._advance()
+        return frame, pts, looped
+
+    def drop_frame(self):
+        if self.peek_pts() is None:
+            return None
+        return self._advance()[1]
+
+    def rewind(self):
+        self.index = 0
+        self.sequence_number = 0
+        self.looped = False
+
+    def stop(self):
+        pass
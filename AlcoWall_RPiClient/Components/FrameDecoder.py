@@ -0,0 +1,120 @@
+import queue
+import threading
+import imageio
+import numpy as np
+from Constants.GENERALCONSTANTS import FRAME_RING_SIZE
+
+class FrameDecoder:
+    """
+    Decodes a video ahead of playback on a worker thread into a fixed ring of
+    preallocated RGB buffers.
+
+    The GUI thread only takes ready buffers with next_frame(). The buffer handed out
+    last stays reserved until the next call, so a QImage wrapping it without a copy
+    stays valid while it is painted.
+    """
+    def __init__(self, video_path, ring_size=FRAME_RING_SIZE, loop=True):
+        self.video_path = video_path
+        self.loop = loop
+        self.reader = imageio.get_reader(video_path)
+        meta_data = self.reader.get_meta_data()
+        self.frame_rate = meta_data['fps']
+        width, height = meta_data['size']
+        self.frames = np.empty((ring_size, height, width, 3), dtype=np.uint8)
+
+        self.free_slots = queue.Queue()
+        for slot in range(ring_size):
+            self.free_slots.put(slot)
+        self.ready_slots = queue.Queue()  # (slot, pts, looped)
+        self.displayed_slot = None
+
+        self.rewind_requested = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        # Presentation timestamps keep increasing across loops, so the player's clock never jumps back
+        sequence_number = 0
+        looped = False
+        while not self.stopped.is_set():
+            try:
+                slot = self.free_slots.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if self.rewind_requested.is_set():
+                self.rewind_requested.clear()
+                self.reader.set_image_index(0)
+                sequence_number = 0
+            try:
+                frame = self.reader.get_next_data()
+            except IndexError:
+                frame = None
+            except Exception as e:
+                print(f"Error reading video frame: {e}")
+                frame = None
+
+            if frame is None:
+                # End of the stream (or a broken frame), restart from the first frame
+                self.free_slots.put(slot)
+                if not self.loop:
+                    break
+                self.reader.set_image_index(0)
+                looped = True
+                continue
+
+            if frame.shape != self.frames.shape[1:]:
+                print(f"Unexpected frame shape {frame.shape} in {self.video_path}")
+                self.free_slots.put(slot)
+                break
+            np.copyto(self.frames[slot], frame)
+            self.ready_slots.put((slot, sequence_number / self.frame_rate, looped))
+            sequence_number += 1
+            looped = False
+
+    def peek_pts(self):
+        """Returns the presentation timestamp of the next decoded frame without taking it."""
+        with self.ready_slots.mutex:
+            if not self.ready_slots.queue:
+                return None
+            return self.ready_slots.queue[0][1]
+
+    def next_frame(self):
+        """
+        Returns (frame, pts, looped) for the next decoded frame, or None if the decoder
+        has not caught up. pts is in seconds, looped is True for the first frame after
+        a wraparound.
+        """
+        try:
+            slot, pts, looped = self.ready_slots.get_nowait()
+        except queue.Empty:
+            return None
+        if self.displayed_slot is not None:
+            self.free_slots.put(self.displayed_slot)
+        self.displayed_slot = slot
+        return self.frames[slot], pts, looped
+
+    def drop_frame(self):
+        """Discards the next decoded frame. Returns its looped flag, or None if nothing was ready."""
+        try:
+            slot, _, looped = self.ready_slots.get_nowait()
+        except queue.Empty:
+            return None
+        self.free_slots.put(slot)
+        return looped
+
+    def rewind(self):
+        """Restarts decoding from the first frame, frames already in the ring are discarded."""
+        while True:
+            try:
+                slot, _, _ = self.ready_slots.get_nowait()
+            except queue.Empty:
+                break
+            self.free_slots.put(slot)
+        self.rewind_requested.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join(timeout=1)
+        self.reader.close()
@@ -1,10 +1,12 @@
+import os
 import sys
 import time
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtCore import Qt, QTimer, QRect
 from PySide6.QtGui import QImage, QPainter, QFont
 from PySide6.QtWidgets import QWidget, QApplication, QVBoxLayout, QSizePolicy, QHBoxLayout
 from PySide6.QtWidgets import QLabel, QLCDNumber
-import imageio
+from Components.FrameCache import FrameCache
+from Components.FrameDecoder import FrameDecoder
 from Components.LCDNumber import LCDNumber
 from Constants.GENERALCONSTANTS import VIDEO_WIDTH, VIDEO_HEIGHT
 from PySide6.QtCore import Signal
@@ -61,31 +63,86 @@ class VideoWidget(QWidget):
         
         self.setLayout(layout)
 
+        self.decoder = None
+        self.frame_caches = {}
         self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.update_frame)
         self.text = "Blow into the alcohol sensor to start"
 
+    def cache_video(self, video_path):
+        """Pre-decodes a short looping clip in the background so later playbacks never decode it again."""
+        frame_cache = FrameCache(video_path)
+        self.frame_caches[os.path.normpath(video_path)] = frame_cache
+        frame_cache.build_async()
+
     def play_video(self, video_path):
-        # Open the video using imageio
-        self.cap = imageio.get_reader(video_path)
-        self.frame_rate = self.cap.get_meta_data()['fps']
-        self.timer.start((1000 // self.frame_rate))  # Targeting approximately 30 FPS
+        # Serve pre-decoded clips from the frame cache, otherwise decode on a worker thread.
+        # Either way the timer only picks up frames that are already decoded
+        if self.decoder:
+            self.decoder.stop()
+        frame_cache = self.frame_caches.get(os.path.normpath(video_path))
+        if frame_cache and frame_cache.ready.is_set():
+            self.decoder = frame_cache.player()
+        else:
+            self.decoder = FrameDecoder(video_path)
+        self.frame_rate = self.decoder.frame_rate
+        self.reset_presentation_clock()
+        # Tick at twice the frame rate, update_frame decides from the clock whether a frame is due
+        self.timer.start(max(1, int(500 / self.frame_rate)))
+
+    def reset_presentation_clock(self):
+        """Restarts pacing, the next frame is shown immediately and defines the time origin."""
+        self.clock_origin = None
+        self.frames_presented = 0
+        self.frames_dropped = 0
+        self.frames_late = 0
 #ota test
     def update_frame(self):
-        try:
-            self.frame = self.cap.get_next_data()
-        except IndexError:
-            # If the video has ended, reset the frame position to loop
-            self.video_finished.emit()
-            self.cap.set_image_index(0)  # Reset to the first frame
-            self.frame = self.cap.get_next_data()
-        except Exception as e:
+        """
+        Presents the newest frame whose presentation time has passed. Older due frames
+        are dropped instead of queued, so playback never falls behind the clock.
+        """
+        now = time.monotonic()
+        pts = self.decoder.peek_pts()
+        if pts is None:
+            return  # Decoder is behind, keep showing the current frame
+        if self.clock_origin is None:
+            self.clock_origin = now - pts
+        playback_time = now - self.clock_origin
+        if pts > playback_time:
+            return  # Not due yet
+
+        # Skip every due frame except the newest one
+        looped = False
+        frame_period = 1 / self.frame_rate
+        while True:
+            next_pts = self.decoder.peek_pts()
+            if next_pts is None or next_pts + frame_period > playback_time:
+                break
+            # The frame after this one is also due, so this one would only be shown late
+            looped = self.decoder.drop_frame() or looped
+            self.frames_dropped += 1
+
+        next_frame = self.decoder.next_frame()
+        if next_frame is None:
+            return
+        self.frame, pts, frame_looped = next_frame
+        self.frames_presented += 1
+        if playback_time - pts > frame_period:
+            self.frames_late += 1
+
+        if looped or frame_looped:
             self.video_finished.emit()
-            self.cap.set_image_index(0)  # Reset to the first frame
-            self.frame = self.cap.get_next_data()
-            print(f"Error reading video frame: {e}")
+            print(f"Playback stats: {self.get_playback_stats()}")
+
+        # Schedule a repaint of the video area only, Qt coalesces pending updates
+        h, w, _ = self.frame.shape
+        self.update(0, 0, w, h)
 
-        self.repaint()
+    def get_playback_stats(self):
+        """Returns presented, dropped and late frame counts since playback started."""
+        return dict(presented=self.frames_presented, dropped=self.frames_dropped, late=self.frames_late)
 
     def paintEvent(self, event):
         try:
@@ -95,14 +152,20 @@ class VideoWidget(QWidget):
                 bytes_per_line = ch * w
                 qt_image = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
 
+                # Only paint the damaged part of the video
+                damage = event.rect().intersected(QRect(0, 0, w, h))
+                if damage.isEmpty():
+                    return
                 painter = QPainter(self)
-                painter.drawImage(0, 0, qt_image)    
+                painter.drawImage(damage, qt_image, damage)
         except Exception as e:
             print(f"Error painting video frame: {e}")
 
     def closeEvent(self, event):
-        self.cap.close()  # Properly close the video reader
+        if self.decoder:
+            self.decoder.stop()  # Properly close the video reader
         event.accept()
 
     def loop_video(self):
-        self.cap.set_image_index(0)  # Reset to the first frame when looping
+        self.decoder.rewind()  # Reset to the first frame when looping
+        self.reset_presentation_clock()
@@ -5,14 +5,86 @@ ERROR_TO_MUCH_TIME_IN_ALCOHOL_CHECK = 100
 BASE_URL = "https://node.alkowall.indigoingenium.ba"  # Intentional wrong URL for retry testing
 DEVICE_ID = 1
 VIDEOS_DIRECTORY = "Media/videos/"
+FALLBACK_VIDEO_PATH = "Media/videos/beer1.mp4"
+AD_CACHE_MANIFEST_FILE = "Media/videos/ad_cache_manifest.json"
+MEDIA_MANIFEST_FILE = "Media/videos/media_manifest.json"
+AD_CACHE_QUOTA_BYTES = 2 * 1024 * 1024 * 1024  # Disk space the ad cache may use
+AD_CACHE_SAVE_DELAY = 30  # Seconds play counts are collected before the ad cache manifest is written
+CAMPAIGN_MANIFEST_FILE = "DatabaseManagement/jsonFiles/campaign_manifest.json"
+CAMPAIGN_MANIFEST_REFRESH_INTERVAL = 300  # Seconds between background manifest syncs
+CAMPAIGN_MANIFEST_REQUEST_TIMEOUT = 10
+TRANSFER_MAX_CONCURRENT = 3  # Concurrent HTTP transfers of all classes
+TRANSFER_MAX_CONCURRENT_MEDIA = 1  # Ad downloads never take all slots
+TRANSFER_REQUEST_TIMEOUT = 10  # Seconds, a hung request must not hold a transfer slot forever
+TRANSFER_RATE_LIMITS = {"telemetry": None, "config": None, "media": 1024 * 1024}  # Bytes per second, None is unlimited
+PAUSE_MEDIA_TRANSFERS_DURING_ALCOHOL_CHECK = True
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_MAX_ATTEMPTS = 5  # Resumed attempts per ad request before giving up
+DOWNLOAD_RETRY_DELAY = 5  # Seconds, multiplied by the attempt number
+DOWNLOAD_REQUEST_TIMEOUT = 30  # Seconds without data before a transfer counts as interrupted
+DOWNLOAD_PART_MAX_AGE = 7 * 24 * 3600  # Partial downloads older than this are discarded at startup
+TRANSCODE_MAX_WORKERS = 1  # Concurrent ffmpeg rescales
+TRANSCODE_NICENESS = 19  # Lowest CPU priority so playback always wins
+TRANSCODE_FFMPEG_THREADS = 2  # Cores a single rescale may use
 TARGET_PLATFORM_SYSTEM = "Linux"
 TARGET_PLATFORM_ARCHITECTURE = "aarch64" # Intentional wrong architecture for retry testing x86_64 is real
+# "auto" uses the real sensor and coin acceptor on the target platform and none elsewhere,
+# "hardware" always uses them, "simulated" uses the simulated backends on any machine
+HARDWARE_BACKEND = "auto"
+HARDWARE_PROCESS_MODE = False  # Run the sensor and coin acceptor I/O in a separate process, samples are shared through shared memory
+HARDWARE_PROCESS_COIN_RING_SIZE = 64  # Coin events the GUI process can fall behind the hardware process
+COIN_ACCEPTANCE_REQUIRED_PERIPHERALS = ("alcohol_sensor",)  # Coins are only accepted once these are initialized
+SIMULATED_SENSOR_BASELINE = 0.4  # Volts of the simulated alcohol sensor in clean air
+SIMULATED_SENSOR_NOISE = 0.005  # Volts, standard deviation of the simulated sensor noise
+SIMULATED_BREATH_PEAKS = (0.0, 0.0, 0.2, 0.6, 1.2)  # Volts above baseline, one is picked per simulated breath
+SIMULATED_SENSOR_TRACES = ()  # .npy files of recorded samples, replayed as breaths instead of synthetic curves
+SIMULATED_COIN_SCRIPT = ((20, 50), (1, 50))  # (seconds after the previous event, coin value), repeated forever
+COIN_POLL_INTERVAL = 0.1  # Seconds between ccTalk credit buffer polls, ccTalk recommends 100-200 ms
+COIN_EVENT_BUFFER_SIZE = 5  # Events the coin validator buffers between two polls
+COIN_ACCEPTOR_DEVICE = "/dev/coin_acceptor"  # udev symlink of the coin validator
+COIN_MAX_FAILED_POLLS = 3  # Unanswered polls in a row before the connection is reopened
+ALCOHOL_SENSOR_I2C_DEVICE = "/dev/i2c-1"  # I2C adapter the ADS1115 is connected to
+DEVICE_POLL_INTERVAL = 0.1  # Seconds between device node checks, udev events wake the check early
+DEVICE_BACKOFF_INITIAL = 0.05  # Seconds, upper bound of the first reopen delay, doubled per failure
+DEVICE_BACKOFF_MAX = 5  # Seconds
+DEVICE_BACKOFF_RESET = 10  # Seconds a device must work before its backoff starts over
 GIT_URL = "https://github.com/Bojan9597/alcoWall.git"
 BRANCH_API_URL = "https://node.alkowall.indigoingenium.ba/status/get_github_branch"
 DEVICE_ID_FILE = "Constants/device_id.txt"
 ALCOHOL_LEVEL_ALLOWED_ERROR = 0.1
+ALCOHOL_CALIBRATION_FILE = "Constants/alcohol_calibration.csv"  # Voltage rise -> per mille BAC table of this device
+ALCOHOL_CALIBRATION_LUT_SIZE = 4096  # Entries of the compiled lookup table
+BREATH_BASELINE_SECONDS = 3  # Sensor history before a test that is used as its baseline
+BREATH_ANALYSIS_INTERVAL = 100  # Milliseconds between breath curve analyses during AlcoholCheck
+BREATH_FILTER_WINDOW = 5  # Samples in the median filter
+BREATH_PLATEAU_SECONDS = 1.5  # How long after the peak the curve must be stable or falling to be decided
+BREATH_PLATEAU_TOLERANCE = 0.03  # Volts the curve may move around the peak and still count as plateau
+BREATH_DECLINE_FRACTION = 0.1  # Drop below the peak that counts as the breath being over
+BREATH_EARLY_COMPLETION = True  # End AlcoholCheck once the peak is stable, COUNTER_FOR_ALCOHOL_MEASURING stays the ceiling
+BREATH_EARLY_COMPLETION_MIN_CONFIDENCE = 0.5
+SESSION_LOG_FILE = "DatabaseManagement/jsonFiles/session_log.json"
+SESSION_LOG_MAX_ENTRIES = 5000
+SESSION_RECORDINGS_DIRECTORY = "DatabaseManagement/sessionRecordings"  # Raw sensor samples of every alcohol check
+SESSION_RECORDINGS_MAX_BYTES = 256 * 1024 * 1024
+SESSION_RECORDINGS_MAX_DAYS = 90
 TIME_IN_ALCOHOL_CHECKED_STATE_FOR_ALCOHOL_SENSOR_COOLDOWN = 10
+ALCOHOL_SENSOR_COOLDOWN_MIN_SECONDS = 3  # The result is always shown at least this long
+ALCOHOL_SENSOR_COOLDOWN_MAX_SECONDS = 60  # Give up waiting for the sensor to recover after this
+ALCOHOL_SENSOR_COOLDOWN_TOLERANCE = 0.05  # Volts from the pre-test baseline that count as recovered
+ALCOHOL_SENSOR_COOLDOWN_WINDOW_SECONDS = 1  # Recent signal whose median is compared to the baseline
+ALCOHOL_SENSOR_COOLDOWN_CHECK_INTERVAL = 250  # Milliseconds
 ALCOHOL_LEVEL_MEASUREMENT_TIME_INTERVAL = 0.2
+ALCOHOL_SENSOR_STREAMING = True  # ADS1115 in continuous conversion mode, one register read per sample
+ALCOHOL_SENSOR_DATA_RATE = 128  # ADS1115 conversions per second (8, 16, 32, 64, 128, 250, 475, 860)
+ALCOHOL_SENSOR_SAMPLE_RATE = 50  # Samples per second read in streaming mode, at most the data rate
+# Samples per second for each state: idle baseline tracking, breath test, sensor cooldown
+ALCOHOL_SENSOR_PROFILE_RATES = {"InitialState": 5, "AlcoholCheck": 50, "AlcoholChecked": 20}
+ALCOHOL_SENSOR_GAIN = 1  # ADS1115 programmable gain, 1 is +-4.096 V
+ALCOHOL_SENSOR_BUFFER_SECONDS = 120  # History kept in the sample ring buffer
 PERCENTAGE_OF_SCREEN_WIDTH_THAT_PROXIMITY_SENSOR_TEXT_TAKES = 0.55
 CREDIT_LABEL_GEOMETRY = (VIDEO_WIDTH - 100, VIDEO_HEIGHT - 100, 100, 50)
 WIDTH_AND_HEIGHT_OF_CREDIT_LABEL = (250, 50)
+SWITCH_LATENCY_HISTORY = 50  # Ad switch latencies kept for get_switch_latency_stats
+FRAME_RING_SIZE = 4  # Decoded frames buffered ahead of the VideoWidget timer
+FRAME_CACHE_DIRECTORY = "/dev/shm"  # tmpfs, pre-decoded clips survive app restarts but not reboots
+FRAME_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Largest clip (as raw RGB frames) that is pre-decoded, it stays in RAM until reboot
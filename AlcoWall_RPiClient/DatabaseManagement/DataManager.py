@@ -4,17 +4,20 @@ from datetime import datetime
 import requests
 from threading import Thread
 from PySide6.QtCore import QObject, Signal
-from Constants.GENERALCONSTANTS import BASE_URL, DEVICE_ID
+from DatabaseManagement.TransferScheduler import TransferScheduler, CONFIG
+from Constants.GENERALCONSTANTS import BASE_URL, DEVICE_ID, CAMPAIGN_MANIFEST_REQUEST_TIMEOUT, TRANSFER_REQUEST_TIMEOUT
 
 class DataManager(QObject):
     # Define PySide6 Signals
     ad_url_signal = Signal(str)
     fun_fact_signal = Signal(str)
+    campaign_manifest_signal = Signal(dict)
 
     def __init__(self, device_id):
         super().__init__()
         self.device_id = device_id
         self.base_url = BASE_URL
+        self.transfer_scheduler = TransferScheduler()
 
     def ensure_directory_exists(self, directory):
         """
@@ -32,7 +35,8 @@ class DataManager(QObject):
             url = f"{self.base_url}/advertisment/get_ad_url"
             payload = {"device_id": self.device_id}
             try:
-                response = requests.post(url, json=payload)
+                with self.transfer_scheduler.transfer(CONFIG):
+                    response = requests.post(url, json=payload, timeout=TRANSFER_REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     ad_url = response.json().get("ad_url")
                     if ad_url:
@@ -49,6 +53,45 @@ class DataManager(QObject):
         thread.daemon = True
         thread.start()
 
+    def get_campaign_manifest(self):
+        """
+        Fetch the whole campaign manifest (ads, weights, time windows, checksums) in one
+        request in a separate thread and emit it through campaign_manifest_signal.
+        Falls back to the single ad URL endpoint if the server has no manifest endpoint.
+        Nothing is emitted on failure, the scheduler keeps its current manifest.
+        """
+        def fetch_campaign_manifest():
+            url = f"{self.base_url}/advertisment/get_campaign_manifest"
+            payload = {"device_id": self.device_id}
+            try:
+                with self.transfer_scheduler.transfer(CONFIG):
+                    response = requests.post(url, json=payload, timeout=CAMPAIGN_MANIFEST_REQUEST_TIMEOUT)
+                if response.status_code == 200:
+                    manifest = response.json()
+                    if isinstance(manifest, dict):
+                        self.campaign_manifest_signal.emit(manifest)
+                    else:
+                        print(f"Ignoring campaign manifest that is not an object: {manifest!r:.200}")
+                    return
+                print(f"Failed to fetch campaign manifest. Status code: {response.status_code}")
+
+                with self.transfer_scheduler.transfer(CONFIG):
+                    response = requests.post(f"{self.base_url}/advertisment/get_ad_url", json=payload,
+                                             timeout=CAMPAIGN_MANIFEST_REQUEST_TIMEOUT)
+                if response.status_code == 200:
+                    ad_data = response.json()
+                    if isinstance(ad_data, dict) and ad_data.get("ad_url"):
+                        self.campaign_manifest_signal.emit({"ads": [{"url": ad_data["ad_url"]}]})
+                    else:
+                        print(f"No ad URL in the response: {ad_data!r:.200}")
+            except (requests.RequestException, ValueError) as e:
+                print(f"Request to fetch campaign manifest failed: {e}")
+
+        # Run in a separate daemon thread
+        thread = Thread(target=fetch_campaign_manifest)
+        thread.daemon = True
+        thread.start()
+
     def get_fun_fact(self):
         """
         Fetches a fun fact from the API in a separate thread.
@@ -58,7 +101,8 @@ class DataManager(QObject):
             fallback_fact = ("Tokom prohibicije u Sjedinjenim Državama, ljudi su pili \"lekovitu\" viskiju "
                              "koju su im lekari prepisivali kao način da legalno dođu do alkohola.")
             try:
-                response = requests.post("https://node.alkowall.indigoingenium.ba/facts/general_fact")
+                with self.transfer_scheduler.transfer(CONFIG):
+                    response = requests.post("https://node.alkowall.indigoingenium.ba/facts/general_fact", timeout=TRANSFER_REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     print(response.json())
                     fact_data = response.json()
@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+from Constants.GENERALCONSTANTS import SESSION_LOG_FILE, SESSION_LOG_MAX_ENTRIES
+
+class SessionLog:
+    """
+    Keeps the durations of the last SESSION_LOG_MAX_ENTRIES alcohol checks and whether
+    they ended early, so the throughput gain of adaptive completion can be measured.
+    """
+    def __init__(self, log_file=SESSION_LOG_FILE, max_entries=SESSION_LOG_MAX_ENTRIES):
+        self.log_file = log_file
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.sessions = self.load()
+
+    def load(self):
+        try:
+            with open(self.log_file, 'r') as file:
+                return json.load(file).get("sessions", [])
+        except FileNotFoundError:
+            return []
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Session log unreadable, starting a new one: {e}")
+            return []
+
+    def save(self):
+        """Atomically writes the log. Must be called with the lock held."""
+        temp_file = f"{self.log_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            with open(temp_file, 'w') as file:
+                json.dump({"sessions": self.sessions}, file)
+            os.replace(temp_file, self.log_file)
+        except OSError as e:
+            print(f"Failed to save session log: {e}")
+
+    def record(self, duration, ended_early, level=None, confidence=None):
+        with self.lock:
+            self.sessions.append({
+                "ended_at": time.time(),
+                "duration": round(duration, 3),
+                "ended_early": ended_early,
+                "level": level,
+                "confidence": confidence,
+            })
+            del self.sessions[:-self.max_entries]
+            self.save()
+
+    def get_stats(self):
+        """Returns duration percentiles (p50/p90/p99) of all, early and full-length sessions."""
+        with self.lock:
+            durations = np.array([session["duration"] for session in self.sessions], dtype=np.float64)
+            early = np.array([session["ended_early"] for session in self.sessions], dtype=bool)
+
+        def percentiles(values):
+            if len(values) == 0:
+                return None
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            return {"count": len(values), "mean": float(values.mean()), "p50": float(p50), "p90": float(p90), "p99": float(p99)}
+
+        return {
+            "all": percentiles(durations),
+            "early": percentiles(durations[early]),
+            "full": percentiles(durations[~early]),
+            "early_fraction": float(early.mean()) if len(early) else 0.0,
+        }
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print(f"Alcohol check sessions, {stats['early_fraction'] * 100:.0f} % ended early:")
+        for name in ("all", "early", "full"):
+            values = stats[name]
+            if values:
+                print(f"  {name}: n={values['count']} mean={values['mean']:.2f} s "
+                      f"p50={values['p50']:.2f} s p90={values['p90']:.2f} s p99={values['p99']:.2f} s")
@@ -0,0 +1,169 @@
+import datetime
+import os
+import queue
+import threading
+import numpy as np
+from sensorReadout.SampleRingBuffer import SAMPLE_DTYPE
+from Constants.GENERALCONSTANTS import SESSION_RECORDINGS_DIRECTORY, SESSION_RECORDINGS_MAX_BYTES, SESSION_RECORDINGS_MAX_DAYS
+
+# One index record per session, the samples are samples[offset:offset + count] of the day file
+INDEX_DTYPE = np.dtype([
+    ('session_id', '<i8'),  # Wall clock time of the test start in ns
+    ('start_ns', '<i8'),  # Monotonic time of the test start, same clock as the sample timestamps
+    ('offset', '<i8'),
+    ('count', '<i4'),
+    ('level', '<f4'),  # The alcohol level that was shown, NaN if there was none
+    ('flags', '<i4'),
+])
+FLAG_ENDED_EARLY = 1
+FLAG_ABORTED = 2
+
+SAMPLES_SUFFIX = ".samples"
+INDEX_SUFFIX = ".index"
+
+class SessionRecorder:
+    """
+    Append-only binary store of the raw sensor samples of every alcohol check.
+
+    Each day has a <date>.samples file of SAMPLE_DTYPE records and a <date>.index file
+    of INDEX_DTYPE records, so a day loads as two memory maps without any parsing.
+    Samples are written before their index record, a torn write is never indexed and
+    is overwritten by the next session. The oldest days are deleted once the store
+    exceeds max_bytes or max_days. Writes happen on a worker thread, so the fsync to
+    the SD card never blocks the GUI thread.
+    """
+    def __init__(self, directory=SESSION_RECORDINGS_DIRECTORY, max_bytes=SESSION_RECORDINGS_MAX_BYTES,
+                 max_days=SESSION_RECORDINGS_MAX_DAYS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_days = max_days
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def day_paths(self, day):
+        base = os.path.join(self.directory, day.isoformat())
+        return base + SAMPLES_SUFFIX, base + INDEX_SUFFIX
+
+    def record(self, session_id, start_ns, samples, level=None, flags=0):
+        """Queues the samples of one session to be appended to the file of its day and returns immediately."""
+        self.jobs.put((session_id, start_ns, np.array(samples, dtype=SAMPLE_DTYPE), level, flags))
+
+    def run(self):
+        """Worker loop, writes one queued session at a time."""
+        while True:
+            job = self.jobs.get()
+            try:
+                self.write(*job)
+            except Exception as e:
+                print(f"Unexpected error while recording session {job[0]}: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def wait_until_written(self):
+        """Blocks until every queued session is on disk."""
+        self.jobs.join()
+
+    def write(self, session_id, start_ns, samples, level=None, flags=0):
+        """Appends the samples of one session to the file of its day."""
+        day = datetime.date.fromtimestamp(session_id / 1e9)
+        with self.lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                samples_path, index_path = self.day_paths(day)
+                with open(samples_path, 'ab') as file:
+                    offset, torn = divmod(file.tell(), SAMPLE_DTYPE.itemsize)
+                    if torn:
+                        file.truncate(offset * SAMPLE_DTYPE.itemsize)
+                    file.write(samples.tobytes())
+                    file.flush()
+                    os.fsync(file.fileno())
+
+                entry = np.zeros(1, dtype=INDEX_DTYPE)
+                entry[0] = (session_id, start_ns, offset, len(samples), np.nan if level is None else level, flags)
+                with open(index_path, 'ab') as file:
+                    # Drop a torn index record of an earlier crash
+                    count = file.tell() // INDEX_DTYPE.itemsize
+                    file.truncate(count * INDEX_DTYPE.itemsize)
+                    file.write(entry.tobytes())
+            except OSError as e:
+                print(f"Failed to record session {session_id}: {e}")
+                return
+            self.rotate()
+
+    def days(self):
+        """Returns the recorded days, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        days = []
+        for name in names:
+            if name.endswith(INDEX_SUFFIX):
+                try:
+                    days.append(datetime.date.fromisoformat(name[:-len(INDEX_SUFFIX)]))
+                except ValueError:
+                    pass
+        return sorted(days)
+
+    def day_size(self, day):
+        return sum(os.path.getsize(path) for path in self.day_paths(day) if os.path.exists(path))
+
+    def rotate(self):
+        """Deletes the oldest days beyond max_days or max_bytes. Must be called with the lock held."""
+        days = self.days()
+        cutoff = datetime.date.today() - datetime.timedelta(days=self.max_days)
+        total = sum(self.day_size(day) for day in days)
+        # The current day is always kept, even if it alone exceeds the quota
+        for day in days[:-1]:
+            if day >= cutoff and total <= self.max_bytes:
+                break
+            total -= self.day_size(day)
+            for path in self.day_paths(day):
+                if os.path.exists(path):
+                    os.remove(path)
+            print(f"Deleted session recordings of {day}")
+
+    def load_day(self, day):
+        """
+        Returns (index, samples) of a day as read-only memory maps, or None if nothing
+        was recorded. Session i is samples[index['offset'][i]:][:index['count'][i]].
+        """
+        samples_path, index_path = self.day_paths(day)
+        if not os.path.exists(index_path) or os.path.getsize(index_path) < INDEX_DTYPE.itemsize:
+            return None
+        index_count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(index_count,))
+        sample_count = os.path.getsize(samples_path) // SAMPLE_DTYPE.itemsize
+        if sample_count == 0:
+            return index, np.zeros(0, dtype=SAMPLE_DTYPE)
+        samples = np.memmap(samples_path, dtype=SAMPLE_DTYPE, mode='r', shape=(sample_count,))
+        return index, samples
+
+    def load_session(self, session_id):
+        """Returns (index record, samples) of one session, or None if it is not recorded."""
+        day = datetime.date.fromtimestamp(session_id / 1e9)
+        loaded = self.load_day(day)
+        if loaded is None:
+            return None
+        index, samples = loaded
+        matches = np.flatnonzero(index['session_id'] == session_id)
+        if len(matches) == 0:
+            return None
+        entry = index[matches[-1]]
+        return entry, samples[entry['offset']:entry['offset'] + entry['count']]
+
+    def sessions_between(self, start_time, end_time):
+        """Returns the index records of all sessions started between two datetimes."""
+        start_id, end_id = int(start_time.timestamp() * 1e9), int(end_time.timestamp() * 1e9)
+        found = []
+        day = start_time.date()
+        while day <= end_time.date():
+            loaded = self.load_day(day)
+            if loaded is not None:
+                index = loaded[0]
+                found.append(np.array(index[(index['session_id'] >= start_id) & (index['session_id'] <= end_id)]))
+            day += datetime.timedelta(days=1)
+        return np.concatenate(found) if found else np.zeros(0, dtype=INDEX_DTYPE)
@@ -0,0 +1,113 @@
+import threading
+import time
+from contextlib import contextmanager
+from Constants.GENERALCONSTANTS import TRANSFER_MAX_CONCURRENT, TRANSFER_MAX_CONCURRENT_MEDIA, TRANSFER_RATE_LIMITS
+
+# Priority classes, a lower value wins
+TELEMETRY = 0
+CONFIG = 1
+MEDIA = 2
+PRIORITY_NAMES = {TELEMETRY: "telemetry", CONFIG: "config", MEDIA: "media"}
+
+class TokenBucket:
+    """Rate limiter in bytes per second, allowing bursts of one second worth of data."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+
+    def delay_for(self, amount):
+        """Consumes amount tokens and returns how long the caller has to wait for them."""
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= amount
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class TransferScheduler:
+    """
+    Shares the uplink between telemetry (cash reports), config (manifest, fun facts)
+    and media (ad downloads) transfers.
+
+    Transfers start in priority order within a global concurrency cap, media has its
+    own lower cap, bytes of rate limited classes go through a token bucket, and a class
+    can be paused, e.g. media while a customer is doing an alcohol check.
+    """
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+        self.condition = threading.Condition()
+        self.active = {priority: 0 for priority in PRIORITY_NAMES}
+        self.waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self.paused = set()
+        self.limits = {TELEMETRY: TRANSFER_MAX_CONCURRENT, CONFIG: TRANSFER_MAX_CONCURRENT, MEDIA: TRANSFER_MAX_CONCURRENT_MEDIA}
+        self.buckets = {priority: TokenBucket(TRANSFER_RATE_LIMITS[name])
+                        for priority, name in PRIORITY_NAMES.items() if TRANSFER_RATE_LIMITS.get(name)}
+        self.bytes_transferred = {priority: 0 for priority in PRIORITY_NAMES}
+        self._initialized = True
+
+    def _can_start(self, priority):
+        if priority in self.paused:
+            return False
+        if sum(self.active.values()) >= TRANSFER_MAX_CONCURRENT or self.active[priority] >= self.limits[priority]:
+            return False
+        # Do not overtake a waiting transfer of a more important class
+        return not any(self.waiting[other] for other in PRIORITY_NAMES if other < priority)
+
+    @contextmanager
+    def transfer(self, priority):
+        """Holds a transfer slot of the given class for the duration of the with block."""
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                while not self._can_start(priority):
+                    self.condition.wait()
+            finally:
+                self.waiting[priority] -= 1
+            self.active[priority] += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active[priority] -= 1
+                self.condition.notify_all()
+
+    def throttle(self, priority, amount):
+        """
+        Called for every chunk of a running transfer. Sleeps to honour the class rate
+        limit and blocks while the class is paused.
+        """
+        with self.condition:
+            while priority in self.paused:
+                self.condition.wait()
+            self.bytes_transferred[priority] += amount
+            bucket = self.buckets.get(priority)
+            delay = bucket.delay_for(amount) if bucket else 0
+        if delay:
+            time.sleep(delay)
+
+    def pause(self, priority):
+        with self.condition:
+            self.paused.add(priority)
+        print(f"Paused {PRIORITY_NAMES[priority]} transfers")
+
+    def resume(self, priority):
+        with self.condition:
+            if priority not in self.paused:
+                return
+            self.paused.discard(priority)
+            self.condition.notify_all()
+        print(f"Resumed {PRIORITY_NAMES[priority]} transfers")
+
+    def get_stats(self):
+        with self.condition:
+            return {name: dict(active=self.active[priority], waiting=self.waiting[priority],
+                               paused=priority in self.paused, bytes=self.bytes_transferred[priority])
+                    for priority, name in PRIORITY_NAMES.items()}
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from Constants.GENERALCONSTANTS import VIDEOS_DIRECTORY, FALLBACK_VIDEO_PATH, AD_CACHE_MANIFEST_FILE, AD_CACHE_QUOTA_BYTES, DOWNLOAD_PART_MAX_AGE
+from Constants.GENERALCONSTANTS import AD_CACHE_SAVE_DELAY
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(path):
+    """Returns the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class AdCache:
+    """
+    Content-addressed on-disk cache for ad videos.
+
+    Files are stored as <sha256><ext> in the videos directory and described by a JSON
+    manifest (size, last played time, play count, source URLs). Lookups go through
+    in-memory indexes, the filesystem is only touched when the cache changes.
+    Least recently played entries are evicted once the quota is exceeded, pinned
+    entries (the fallback clip) are never evicted. Nothing slow happens on construction,
+    untracked files are hashed by adopt_untracked_files() on the ingest worker.
+    """
+    def __init__(self, directory=VIDEOS_DIRECTORY, manifest_file=AD_CACHE_MANIFEST_FILE,
+                 quota_bytes=AD_CACHE_QUOTA_BYTES, pinned_paths=(FALLBACK_VIDEO_PATH,)):
+        self.directory = directory
+        self.manifest_file = manifest_file
+        self.quota_bytes = quota_bytes
+        self.pinned_files = {os.path.basename(path) for path in pinned_paths}
+        self.lock = threading.Lock()
+
+        self.entries = {}  # content hash -> entry
+        self.url_index = {}  # ad URL -> content hash
+        self.file_index = {}  # file name -> content hash
+        self.save_timer = None  # Pending deferred manifest write
+
+        self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_file, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Ad cache manifest unreadable, rebuilding: {e}")
+            return
+
+        for content_hash, entry in data.get("entries", {}).items():
+            if not os.path.exists(os.path.join(self.directory, entry["file"])):
+                continue
+            self._index_entry(content_hash, entry)
+
+    def adopt_untracked_files(self):
+        """
+        Registers files that are not in the manifest (pinned clips, ads downloaded by
+        older versions), removes leftovers of interrupted processing and evicts down to
+        the quota. Hashes every untracked file, so it must not run on the GUI thread.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for file_name in os.listdir(self.directory):
+            path = os.path.join(self.directory, file_name)
+            with self.lock:
+                tracked = file_name in self.file_index
+            if not os.path.isfile(path) or tracked:
+                continue
+            if file_name.endswith(".download.part"):
+                # Interrupted download, kept so it can be resumed unless it was abandoned
+                if time.time() - os.path.getmtime(path) > DOWNLOAD_PART_MAX_AGE:
+                    os.remove(path)
+                    if os.path.exists(f"{path}.validator"):
+                        os.remove(f"{path}.validator")
+                continue
+            if file_name.endswith(".download.part.validator"):
+                # Identifies the version of an interrupted download, useless without it
+                if not os.path.exists(path[:-len(".validator")]):
+                    os.remove(path)
+                continue
+            if file_name.endswith((".download", ".normalized", ".part")):
+                os.remove(path)
+                continue
+            if not file_name.endswith(".mp4"):
+                continue
+            content_hash = file_sha256(path)
+            with self.lock:
+                self._index_entry(content_hash, dict(
+                    file=file_name,
+                    size=os.path.getsize(path),
+                    last_played=0,
+                    play_count=0,
+                    urls=[],
+                ))
+        with self.lock:
+            self.evict()
+            self.save_manifest()
+
+    def _index_entry(self, content_hash, entry):
+        entry["pinned"] = entry["file"] in self.pinned_files
+        self.entries[content_hash] = entry
+        self.file_index[entry["file"]] = content_hash
+        for url in entry["urls"]:
+            self.url_index[url] = content_hash
+
+    def save_manifest(self):
+        """Atomically writes the manifest. Must be called with the lock held."""
+        temp_file = f"{self.manifest_file}.tmp"
+        try:
+            with open(temp_file, 'w') as file:
+                json.dump({"entries": self.entries}, file)
+            os.replace(temp_file, self.manifest_file)
+        except OSError as e:
+            print(f"Failed to save ad cache manifest: {e}")
+
+    def lookup(self, ad_url):
+        """Returns the cached path for the ad URL or None."""
+        with self.lock:
+            content_hash = self.url_index.get(ad_url)
+            if content_hash is None:
+                return None
+            return os.path.join(self.directory, self.entries[content_hash]["file"])
+
+    def add(self, ad_url, source_path, content_hash=None):
+        """
+        Moves a fully validated file into the cache and returns its cached path.
+        Files with identical content are stored once.
+        """
+        if content_hash is None:
+            content_hash = file_sha256(source_path)
+
+        with self.lock:
+            entry = self.entries.get(content_hash)
+            if entry is None:
+                file_name = content_hash + (os.path.splitext(urlparse(ad_url).path)[1] or ".mp4")
+                os.replace(source_path, os.path.join(self.directory, file_name))
+                entry = dict(
+                    file=file_name,
+                    size=os.path.getsize(os.path.join(self.directory, file_name)),
+                    last_played=time.time(),
+                    play_count=0,
+                    urls=[],
+                )
+                self._index_entry(content_hash, entry)
+            elif os.path.exists(source_path):
+                os.remove(source_path)
+
+            if ad_url not in entry["urls"]:
+                entry["urls"].append(ad_url)
+                self.url_index[ad_url] = content_hash
+
+            self.evict(keep=content_hash)
+            self.save_manifest()
+            return os.path.join(self.directory, entry["file"])
+
+    def mark_played(self, video_path):
+        """
+        Updates the LRU information of the played file. Called on every video switch,
+        so the manifest is written AD_CACHE_SAVE_DELAY seconds later on a timer thread,
+        once for all plays in between.
+        """
+        with self.lock:
+            content_hash = self.file_index.get(os.path.basename(video_path))
+            if content_hash is None:
+                return
+            entry = self.entries[content_hash]
+            entry["last_played"] = time.time()
+            entry["play_count"] += 1
+            if self.save_timer is None:
+                self.save_timer = threading.Timer(AD_CACHE_SAVE_DELAY, self.save_deferred)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+
+    def save_deferred(self):
+        with self.lock:
+            self.save_timer = None
+            self.save_manifest()
+
+    def paths(self):
+        """Returns the paths of all cached files."""
+        with self.lock:
+            return [os.path.join(self.directory, entry["file"]) for entry in self.entries.values()]
+
+    def remove(self, video_path):
+        """Deletes an unpinned file from the cache."""
+        with self.lock:
+            content_hash = self.file_index.get(os.path.basename(video_path))
+            if content_hash is None or self.entries[content_hash]["pinned"]:
+                return False
+            self._drop_entry(content_hash)
+            self.save_manifest()
+            return True
+
+    def _drop_entry(self, content_hash):
+        entry = self.entries.pop(content_hash)
+        self.file_index.pop(entry["file"], None)
+        for url in entry["urls"]:
+            self.url_index.pop(url, None)
+        try:
+            os.remove(os.path.join(self.directory, entry["file"]))
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def usage_bytes(self):
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def evict(self, keep=None):
+        """
+        Removes least recently played entries until the cache fits the quota.
+        Must be called with the lock held.
+        """
+        usage = self.usage_bytes()
+        if usage <= self.quota_bytes:
+            return
+
+        candidates = sorted(
+            (content_hash for content_hash, entry in self.entries.items()
+             if not entry["pinned"] and content_hash != keep),
+            key=lambda content_hash: self.entries[content_hash]["last_played"]
+        )
+        for content_hash in candidates:
+            if usage <= self.quota_bytes:
+                break
+            entry = self._drop_entry(content_hash)
+            usage -= entry["size"]
+            print(f"Evicted {entry['file']} from the ad cache ({entry['size']} bytes)")
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import re
+import time
+import requests
+from DatabaseManagement.TransferScheduler import TransferScheduler, MEDIA
+from MediaManagement.AdCache import file_sha256
+from Constants.GENERALCONSTANTS import DOWNLOAD_CHUNK_SIZE, DOWNLOAD_MAX_ATTEMPTS, DOWNLOAD_RETRY_DELAY, DOWNLOAD_REQUEST_TIMEOUT
+
+class DownloadError(Exception):
+    """Raised when a transfer ends before the whole file was received."""
+    pass
+
+class AdDownloader:
+    """
+    Downloads files into <destination>.part and resumes interrupted transfers with
+    HTTP Range requests. A SHA-256 is computed while writing, and the file is only
+    renamed to its destination once it is complete and matches the expected checksum.
+    """
+    def __init__(self, chunk_size=DOWNLOAD_CHUNK_SIZE, max_attempts=DOWNLOAD_MAX_ATTEMPTS):
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.transfer_scheduler = TransferScheduler()
+
+    def download(self, url, destination, expected_sha256=None):
+        """Returns the SHA-256 hex digest of the downloaded file, or None on failure."""
+        part_path = f"{destination}.part"
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+
+        content_hash = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                content_hash = self._transfer(url, part_path)
+                break
+            except (requests.RequestException, DownloadError) as e:
+                print(f"Download of {url} interrupted (attempt {attempt}/{self.max_attempts}): {e}")
+                if attempt < self.max_attempts:
+                    time.sleep(DOWNLOAD_RETRY_DELAY * attempt)
+        if content_hash is None:
+            return None  # A partial .part file is kept, the next request resumes it
+
+        if expected_sha256 and content_hash != expected_sha256.lower():
+            print(f"Checksum mismatch for {url}: expected {expected_sha256}, got {content_hash}")
+            self._discard(part_path)
+            return None
+
+        os.replace(part_path, destination)
+        self._discard(part_path)  # Only the validator is left
+        print(f"Video downloaded successfully and saved to {destination}")
+        return content_hash
+
+    def _transfer(self, url, part_path):
+        """
+        Transfers the missing part of the file. Returns the SHA-256 hex digest of the complete
+        file, None if the server refused the download.
+        """
+        with self.transfer_scheduler.transfer(MEDIA):
+            return self._transfer_range(url, part_path)
+
+    def _transfer_range(self, url, part_path):
+        """
+        Resumes only if the server confirms with If-Range that the file did not change
+        since the .part file was started (its ETag or Last-Modified and total size are
+        stored in <part>.validator), otherwise the download starts over.
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = self._load_validator(part_path) if offset else None
+        if offset and not validator:
+            print(f"Cannot verify the partial download of {url}, starting over")
+            self._discard(part_path)
+            offset = 0
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator["if_range"]} if offset else {}
+        response = requests.get(url, stream=True, headers=headers, timeout=DOWNLOAD_REQUEST_TIMEOUT)
+        with response:
+            content_range = parse_content_range(response.headers.get("Content-Range", ""))
+            if response.status_code == 416 and offset:
+                # Nothing left to fetch if the previous attempt got the whole file of this version
+                if content_range == (None, None, offset) and validator["total"] == offset:
+                    return file_sha256(part_path)
+                print(f"Partial download of {url} does not match the file on the server, starting over")
+                self._discard(part_path)
+                return self._transfer_range(url, part_path)
+            if response.status_code == 206 and offset:
+                if content_range is None or content_range[0] != offset or content_range[2] != validator["total"]:
+                    print(f"Partial download of {url} does not match the file on the server, starting over")
+                    self._discard(part_path)
+                    return self._transfer_range(url, part_path)
+                print(f"Resuming download of {url} at byte {offset}")
+                expected_total = validator["total"]
+                digest = None
+                mode = 'ab'
+            elif response.status_code == 200:
+                # No range support, the file changed or nothing to resume, start from scratch
+                content_length = response.headers.get("Content-Length")
+                expected_total = int(content_length) if content_length is not None else None
+                self._save_validator(part_path, response.headers, expected_total)
+                digest = hashlib.sha256()
+                offset = 0
+                mode = 'wb'
+            else:
+                print(f"Failed to download video. Status code: {response.status_code}")
+                return None
+
+            received = 0
+            with open(part_path, mode) as part_file:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        # Rate limit, and wait here while media transfers are paused
+                        self.transfer_scheduler.throttle(MEDIA, len(chunk))
+                        part_file.write(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+                        received += len(chunk)
+
+        if expected_total is not None and offset + received < expected_total:
+            raise DownloadError(f"received {offset + received} bytes, expected {expected_total}")
+        return digest.hexdigest() if digest is not None else file_sha256(part_path)
+
+    def _save_validator(self, part_path, headers, total):
+        """
+        Stores what identifies the version being downloaded. Weak ETags can not be
+        used with If-Range, without a strong ETag or Last-Modified the part can not be resumed.
+        """
+        etag = headers.get("ETag")
+        if_range = etag if etag and not etag.startswith("W/") else headers.get("Last-Modified")
+        validator_path = f"{part_path}.validator"
+        if not if_range or total is None:
+            if os.path.exists(validator_path):
+                os.remove(validator_path)
+            return
+        with open(validator_path, "w") as file:
+            json.dump({"if_range": if_range, "total": total}, file)
+
+    def _load_validator(self, part_path):
+        try:
+            with open(f"{part_path}.validator", "r") as file:
+                validator = json.load(file)
+            return validator if validator.get("if_range") and isinstance(validator.get("total"), int) else None
+        except (OSError, ValueError):
+            return None
+
+    def _discard(self, part_path):
+        for path in (part_path, f"{part_path}.validator"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def parse_content_range(header):
+    """
+    Parses "bytes first-last/total" or "bytes */total" into (first, last, total),
+    None for parts that are not given ("*"). Returns None if the header is invalid.
+    """
+    match = re.fullmatch(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)", header.strip())
+    if not match:
+        return None
+    return tuple(int(value) if value and value != "*" else None for value in match.groups())
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import queue
+import threading
+from PySide6.QtCore import QObject, Signal
+from MediaManagement.AdDownloader import AdDownloader
+from MediaManagement.TranscodeQueue import TranscodeQueue, TranscodeJob
+from Constants.GENERALCONSTANTS import VIDEO_WIDTH, VIDEO_HEIGHT, VIDEOS_DIRECTORY
+
+class AdIngestPipeline(QObject):
+    """
+    Downloads and validates ads on a background worker thread and rescales them on
+    the transcode queue, so the GUI thread never blocks on network or ffmpeg work.
+    """
+    # Emitted from the worker thread, delivered on the GUI thread
+    ad_ready_signal = Signal(str, str)  # ad_url, video_path
+    ad_failed_signal = Signal(str, str)  # ad_url, reason
+
+    def __init__(self, ad_cache, media_manifest, videos_directory=VIDEOS_DIRECTORY):
+        super().__init__()
+        self.ad_cache = ad_cache
+        self.media_manifest = media_manifest
+        self.transcode_queue = TranscodeQueue()
+        self.downloader = AdDownloader()
+        self.videos_directory = videos_directory
+        self.jobs = queue.Queue()
+        self.pending_urls = set()
+        self.pending_lock = threading.Lock()
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def download_path_for_url(self, ad_url):
+        """Returns the path a completely downloaded ad is validated in, the transfer itself goes to <path>.part."""
+        url_hash = hashlib.sha1(ad_url.encode()).hexdigest()
+        return os.path.join(self.videos_directory, f"{url_hash}.download")
+
+    def normalized_path_for_url(self, ad_url):
+        """Returns the path the rescaled ad is written to before it enters the cache."""
+        return f"{self.download_path_for_url(ad_url)}.normalized"
+
+    def request_ad(self, ad_url, expected_sha256=None):
+        """
+        Queues an ad for ingest and returns immediately. The download is rejected if
+        expected_sha256 is given and does not match.
+        Returns False if the ad is already queued or being processed.
+        """
+        with self.pending_lock:
+            if ad_url in self.pending_urls:
+                return False
+            self.pending_urls.add(ad_url)
+        self.jobs.put((ad_url, expected_sha256))
+        return True
+
+    def is_pending(self, ad_url):
+        with self.pending_lock:
+            return ad_url in self.pending_urls
+
+    def run(self):
+        """Worker loop, downloads and validates one ad at a time and hands rescales to the transcode queue."""
+        self.ad_cache.adopt_untracked_files()
+        self.validate_cached_videos()
+        while True:
+            ad_url, expected_sha256 = self.jobs.get()
+            try:
+                self.ingest(ad_url, expected_sha256)
+            except Exception as e:
+                print(f"Unexpected error while ingesting {ad_url}: {e}")
+                self.fail(ad_url, str(e))
+
+    def validate_cached_videos(self):
+        """
+        Makes sure every cached file has a manifest record. Only files that were never
+        probed cost any ffprobe/ffmpeg work, corrupted ones are removed from the cache.
+        """
+        for video_path in self.ad_cache.paths():
+            try:
+                record = self.media_manifest.probe(video_path)
+            except OSError as e:
+                print(f"Error validating {video_path}: {e}")
+                continue
+            if not record["valid"]:
+                print(f"Cached video is corrupted, removing: {video_path}")
+                self.ad_cache.remove(video_path)
+        self.media_manifest.prune(self.ad_cache.paths())
+
+    def ingest(self, ad_url, expected_sha256=None):
+        """
+        Downloads the ad to a temporary file, validates and normalizes it, and only
+        then adds it to the ad cache, so a partially processed file is never played.
+        Every path ends in finish() or fail(), possibly from a transcode worker.
+        """
+        cached_path = self.ad_cache.lookup(ad_url)
+        if cached_path:
+            self.ad_ready_signal.emit(ad_url, cached_path)
+            self.release(ad_url)
+            return
+
+        download_path = self.download_path_for_url(ad_url)
+        content_hash = self.downloader.download(ad_url, download_path, expected_sha256)
+        if not content_hash:
+            self.fail(ad_url, "download failed")
+            return
+
+        record = self.media_manifest.probe(download_path, content_hash)
+        if not record["valid"]:
+            print(f"Downloaded video is corrupted, deleting: {download_path}")
+            self.fail(ad_url, "video corrupted")
+            return
+
+        print(f"Video resolution: {record['width']}x{record['height']}")
+        if (record["width"], record["height"]) == (VIDEO_WIDTH, VIDEO_HEIGHT):
+            self.finish(ad_url, download_path, converted=False)
+            return
+
+        print(f"Converting video to {VIDEO_WIDTH}x{VIDEO_HEIGHT} resolution...")
+        self.transcode_queue.submit(
+            download_path, self.normalized_path_for_url(ad_url), VIDEO_WIDTH, VIDEO_HEIGHT,
+            duration=record["duration"], on_finished=lambda job: self.transcode_finished(ad_url, job)
+        )
+
+    def transcode_finished(self, ad_url, job):
+        """Called from a transcode worker thread."""
+        try:
+            if job.state == TranscodeJob.DONE:
+                self.finish(ad_url, job.output_path, converted=True)
+            else:
+                self.fail(ad_url, f"conversion {job.state}")
+        except Exception as e:
+            print(f"Unexpected error while ingesting {ad_url}: {e}")
+            self.fail(ad_url, str(e))
+
+    def finish(self, ad_url, video_path, converted):
+        content_hash = self.media_manifest.content_hash(video_path)
+        cached_path = self.ad_cache.add(ad_url, video_path, content_hash)
+        # Our own transcode output only needs ffprobe, the source was already decoded once
+        self.media_manifest.probe(cached_path, content_hash, check_integrity=not converted)
+        print(f"Ad ready: {cached_path}")
+        self.cleanup(ad_url)
+        self.ad_ready_signal.emit(ad_url, cached_path)
+        self.release(ad_url)
+
+    def fail(self, ad_url, reason):
+        self.cleanup(ad_url)
+        self.ad_failed_signal.emit(ad_url, reason)
+        self.release(ad_url)
+
+    def cleanup(self, ad_url):
+        for path in (self.download_path_for_url(ad_url), self.normalized_path_for_url(ad_url)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def release(self, ad_url):
+        with self.pending_lock:
+            self.pending_urls.discard(ad_url)
+
+    def cancel_transcodes(self):
+        """Stops all queued and running rescales, the ads are ingested again when next requested."""
+        self.transcode_queue.cancel_all()
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from datetime import datetime, time as day_time
+from math import gcd
+from functools import reduce
+from Constants.GENERALCONSTANTS import CAMPAIGN_MANIFEST_FILE
+
+class AdScheduler:
+    """
+    Picks the next ad locally from the campaign manifest, without any network call.
+
+    Manifest format (as sent by /advertisment/get_campaign_manifest):
+        {"version": "...", "ads": [{"ad_id": 1, "url": "...", "sha256": "...", "weight": 3,
+                                    "start": "2024-11-01T00:00:00", "end": "2024-12-01T00:00:00",
+                                    "daily_start": "08:00", "daily_end": "22:00"}, ...]}
+    Only url is required. A weighted rotation is precomputed when a manifest is loaded,
+    next_ad() walks it and skips ads that are outside their time window or not cached yet.
+    The last manifest is persisted so the schedule survives reboots without internet.
+    """
+    def __init__(self, manifest_file=CAMPAIGN_MANIFEST_FILE):
+        self.manifest_file = manifest_file
+        self.lock = threading.Lock()
+        self.version = None
+        self.ads = []
+        self.rotation = []
+        self.cursor = 0
+        self.load_persisted()
+
+    def load_persisted(self):
+        try:
+            with open(self.manifest_file, 'r') as file:
+                self.load(json.load(file), persist=False)
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError, ValueError) as e:
+            print(f"Stored campaign manifest unreadable: {e}")
+
+    def load(self, manifest, persist=True):
+        """
+        Replaces the schedule with the ads of the manifest. Malformed ads are skipped,
+        a manifest without an ads list is ignored. Returns True if it changed.
+        """
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("ads", []), list):
+            print("Ignoring malformed campaign manifest")
+            return False
+        ads = []
+        for ad in manifest.get("ads", []):
+            try:
+                ads.append(self._parse_ad(ad))
+            except (ValueError, TypeError, KeyError) as e:
+                print(f"Skipping malformed ad {ad!r}: {e}")
+        rotation = self._build_rotation([ad["weight"] for ad in ads])
+        with self.lock:
+            # Weights, time windows and checksums count too, not only the version and the URLs
+            changed = manifest.get("version") != self.version or ads != self.ads
+            if rotation != self.rotation:
+                self.cursor = 0
+            elif rotation:
+                self.cursor %= len(rotation)  # Same rotation, a refresh does not restart it
+            self.version = manifest.get("version")
+            self.ads = ads
+            self.rotation = rotation
+
+        if persist and changed:
+            os.makedirs(os.path.dirname(self.manifest_file), exist_ok=True)
+            temp_file = f"{self.manifest_file}.tmp"
+            with open(temp_file, 'w') as file:
+                json.dump(manifest, file)
+            os.replace(temp_file, self.manifest_file)
+        return changed
+
+    def _parse_ad(self, ad):
+        def parse_datetime(value):
+            return datetime.fromisoformat(value) if value else None
+
+        def parse_time(value):
+            return day_time.fromisoformat(value) if value else None
+
+        if not isinstance(ad["url"], str) or not ad["url"]:
+            raise ValueError("url must be a non-empty string")
+        return dict(
+            ad_id=ad.get("ad_id"),
+            url=ad["url"],
+            sha256=ad.get("sha256"),
+            weight=max(int(ad.get("weight", 1)), 1),
+            start=parse_datetime(ad.get("start")),
+            end=parse_datetime(ad.get("end")),
+            daily_start=parse_time(ad.get("daily_start")),
+            daily_end=parse_time(ad.get("daily_end")),
+        )
+
+    def _build_rotation(self, weights):
+        """
+        Smooth weighted round robin: weights 3 and 1 give A A B A instead of A A A B,
+        so heavy ads are spread out over the loop.
+        """
+        if not weights:
+            return []
+        divisor = reduce(gcd, weights)
+        weights = [weight // divisor for weight in weights]
+        current = [0] * len(weights)
+        total = sum(weights)
+        rotation = []
+        for _ in range(total):
+            for index, weight in enumerate(weights):
+                current[index] += weight
+            chosen = max(range(len(weights)), key=lambda index: current[index])
+            current[chosen] -= total
+            rotation.append(chosen)
+        return rotation
+
+    def is_scheduled(self, ad, now):
+        if ad["start"] and now < ad["start"]:
+            return False
+        if ad["end"] and now >= ad["end"]:
+            return False
+        if ad["daily_start"] and ad["daily_end"]:
+            current_time = now.time()
+            if ad["daily_start"] <= ad["daily_end"]:
+                return ad["daily_start"] <= current_time < ad["daily_end"]
+            # Window over midnight, e.g. 20:00 - 02:00
+            return current_time >= ad["daily_start"] or current_time < ad["daily_end"]
+        return True
+
+    def next_ad(self, is_available=lambda ad: True, now=None):
+        """
+        Advances the rotation and returns the next ad that is scheduled right now and
+        available (e.g. cached), or None if there is none.
+        """
+        now = now or datetime.now()
+        with self.lock:
+            for _ in range(len(self.rotation)):
+                ad = self.ads[self.rotation[self.cursor]]
+                self.cursor = (self.cursor + 1) % len(self.rotation)
+                if self.is_scheduled(ad, now) and is_available(ad):
+                    return ad
+        return None
+
+    def get_ads(self):
+        with self.lock:
+            return list(self.ads)
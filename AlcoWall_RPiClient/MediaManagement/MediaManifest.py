@@ -0,0 +1,133 @@
+import json
+import os
+import subprocess
+import threading
+from MediaManagement.AdCache import file_sha256
+from Constants.GENERALCONSTANTS import MEDIA_MANIFEST_FILE
+
+class MediaManifest:
+    """
+    Persistent record of probe and integrity results for every video file.
+
+    Records are keyed by content hash, and a per-file (size, mtime) index avoids
+    rehashing unchanged files, so ffprobe and the full ffmpeg integrity decode run
+    once per file content and survive reboots and cache renames.
+    """
+    def __init__(self, manifest_file=MEDIA_MANIFEST_FILE):
+        self.manifest_file = manifest_file
+        self.lock = threading.Lock()
+        self.records = {}  # content hash -> probe record
+        self.files = {}  # file path -> {"size", "mtime_ns", "sha256"}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.manifest_file, 'r') as file:
+                data = json.load(file)
+            self.records = data.get("records", {})
+            self.files = data.get("files", {})
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Media manifest unreadable, rebuilding: {e}")
+
+    def save(self):
+        """Atomically writes the manifest. Must be called with the lock held."""
+        temp_file = f"{self.manifest_file}.tmp"
+        try:
+            with open(temp_file, 'w') as file:
+                json.dump({"records": self.records, "files": self.files}, file)
+            os.replace(temp_file, self.manifest_file)
+        except OSError as e:
+            print(f"Failed to save media manifest: {e}")
+
+    def content_hash(self, video_path, content_hash=None):
+        """Returns the file's content hash, reading the file only if it changed."""
+        stat = os.stat(video_path)
+        with self.lock:
+            known = self.files.get(video_path)
+            if content_hash is None and known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                return known["sha256"]
+        if content_hash is None:
+            content_hash = file_sha256(video_path)
+        with self.lock:
+            self.files[video_path] = dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=content_hash)
+            self.save()
+        return content_hash
+
+    def get(self, video_path, content_hash=None):
+        """Returns the stored record for the file or None if it was never probed."""
+        content_hash = self.content_hash(video_path, content_hash)
+        with self.lock:
+            return self.records.get(content_hash)
+
+    def probe(self, video_path, content_hash=None, check_integrity=True):
+        """
+        Returns the record for the file, running ffprobe (and the integrity decode
+        if requested) only when the content has not been probed before.
+        Record keys: sha256, valid, width, height, duration, codec.
+        """
+        content_hash = self.content_hash(video_path, content_hash)
+        with self.lock:
+            record = self.records.get(content_hash)
+        if record and (record["integrity_checked"] or not check_integrity):
+            return record
+
+        record = probe_video(video_path)
+        record["sha256"] = content_hash
+        record["integrity_checked"] = check_integrity
+        if check_integrity and record["valid"] and is_video_corrupted(video_path):
+            record["valid"] = False
+
+        with self.lock:
+            self.records[content_hash] = record
+            self.save()
+        return record
+
+    def prune(self, existing_paths):
+        """Drops entries for files that no longer exist."""
+        existing_paths = set(existing_paths)
+        with self.lock:
+            self.files = {path: info for path, info in self.files.items() if path in existing_paths}
+            live_hashes = {info["sha256"] for info in self.files.values()}
+            self.records = {content_hash: record for content_hash, record in self.records.items()
+                            if content_hash in live_hashes}
+            self.save()
+
+def probe_video(video_path):
+    """Reads resolution, duration and codec of the first video stream with one ffprobe call."""
+    record = dict(valid=False, width=None, height=None, duration=None, codec=None)
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "stream=width,height,codec_name:format=duration",
+             "-of", "json", video_path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+        info = json.loads(result.stdout)
+        stream = info["streams"][0]
+        record["width"] = int(stream["width"])
+        record["height"] = int(stream["height"])
+        record["codec"] = stream.get("codec_name")
+        duration = info.get("format", {}).get("duration")
+        record["duration"] = float(duration) if duration else None
+        record["valid"] = result.returncode == 0
+    except Exception as e:
+        print(f"Error probing video {video_path}: {e}")
+    return record
+
+def is_video_corrupted(video_path):
+    """Check if the video is corrupted by decoding it completely with ffmpeg."""
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-v", "error", "-i", video_path, "-f", "null", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        # If ffmpeg returns an error, the video is likely corrupted
+        if result.returncode != 0:
+            print(f"ffmpeg error: {result.stderr.decode()}")
+            return True
+        return False
+    except Exception as e:
+        print(f"Error checking video corruption: {e}")
+        return True
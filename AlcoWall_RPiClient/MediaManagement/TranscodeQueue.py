@@ -0,0 +1,177 @@
+import itertools
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from PySide6.QtCore import QObject, Signal
+from Constants.GENERALCONSTANTS import TRANSCODE_MAX_WORKERS, TRANSCODE_NICENESS, TRANSCODE_FFMPEG_THREADS
+
+class TranscodeJob:
+    """State and timings of a single ffmpeg rescale."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, job_id, source_path, output_path, width, height, duration=None, on_finished=None):
+        self.job_id = job_id
+        self.source_path = source_path
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.duration = duration
+        self.on_finished = on_finished
+
+        self.state = TranscodeJob.QUEUED
+        self.progress = 0.0
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.process = None
+        self.cancel_requested = False
+        self.finished = threading.Event()
+
+    def queue_seconds(self):
+        return (self.started_at or time.monotonic()) - self.queued_at
+
+    def run_seconds(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def as_dict(self):
+        return dict(
+            job_id=self.job_id,
+            source_path=self.source_path,
+            state=self.state,
+            progress=round(self.progress, 3),
+            queue_seconds=round(self.queue_seconds(), 2),
+            run_seconds=round(self.run_seconds(), 2),
+        )
+
+class TranscodeQueue(QObject):
+    """
+    Runs ffmpeg rescales on a bounded number of worker threads at idle CPU and I/O
+    priority, so normalizing ads does not compete with playback. Output is written to
+    a temporary file and renamed into place only when ffmpeg succeeds.
+    """
+    progress_signal = Signal(int, float)  # job_id, fraction done
+    finished_signal = Signal(int, str, float)  # job_id, final state, seconds spent transcoding
+
+    def __init__(self, max_workers=TRANSCODE_MAX_WORKERS):
+        super().__init__()
+        self.jobs = queue.Queue()
+        self.job_ids = itertools.count(1)
+        self.active_jobs = {}
+        self.finished_jobs = []
+        self.lock = threading.Lock()
+
+        self.workers = [threading.Thread(target=self.run, daemon=True) for _ in range(max_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, source_path, output_path, width, height, duration=None, on_finished=None):
+        """
+        Queues a rescale of source_path to width x height.
+        on_finished(job) is called from the worker thread once the job has ended.
+        """
+        job = TranscodeJob(next(self.job_ids), source_path, output_path, width, height, duration, on_finished)
+        with self.lock:
+            self.active_jobs[job.job_id] = job
+        self.jobs.put(job)
+        return job
+
+    def cancel(self, job):
+        """Cancels a queued job or terminates a running ffmpeg process."""
+        with self.lock:
+            job.cancel_requested = True
+            process = job.process
+        if process and process.poll() is None:
+            process.terminate()
+
+    def cancel_all(self):
+        with self.lock:
+            jobs = list(self.active_jobs.values())
+        for job in jobs:
+            self.cancel(job)
+
+    def stats(self):
+        """Returns timing information of active and recently finished jobs."""
+        with self.lock:
+            return [job.as_dict() for job in list(self.active_jobs.values()) + self.finished_jobs]
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job.cancel_requested:
+                self._finish(job, TranscodeJob.CANCELLED)
+                continue
+            try:
+                self._finish(job, self.transcode(job))
+            except Exception as e:
+                print(f"Unexpected error while transcoding {job.source_path}: {e}")
+                self._finish(job, TranscodeJob.FAILED)
+
+    def build_command(self, job, temp_path):
+        command = []
+        if shutil.which("nice"):
+            command += ["nice", "-n", str(TRANSCODE_NICENESS)]
+        if shutil.which("ionice"):
+            command += ["ionice", "-c", "3"]  # Idle I/O class
+        command += ["ffmpeg", "-y", "-nostdin", "-nostats", "-v", "error", "-progress", "pipe:1",
+                    "-i", job.source_path, "-vf", f"scale={job.width}:{job.height}", "-crf", "23",
+                    "-threads", str(TRANSCODE_FFMPEG_THREADS), "-f", "mp4", temp_path]
+        return command
+
+    def transcode(self, job):
+        temp_path = f"{job.output_path}.part"
+        with self.lock:
+            if job.cancel_requested:
+                return TranscodeJob.CANCELLED
+            job.state = TranscodeJob.RUNNING
+            job.started_at = time.monotonic()
+            # Only stdout is read while ffmpeg runs, a stderr pipe could fill up and block it
+            error_output = tempfile.TemporaryFile()
+            job.process = subprocess.Popen(self.build_command(job, temp_path),
+                                           stdout=subprocess.PIPE, stderr=error_output,
+                                           universal_newlines=True)
+        try:
+            for line in job.process.stdout:
+                key, _, value = line.strip().partition("=")
+                # out_time_us is microseconds of output written so far
+                if key == "out_time_us" and job.duration and value.isdigit():
+                    job.progress = min(int(value) / 1e6 / job.duration, 1.0)
+                    self.progress_signal.emit(job.job_id, job.progress)
+            job.process.wait()
+
+            if job.cancel_requested:
+                return TranscodeJob.CANCELLED
+            if job.process.returncode != 0:
+                error_output.seek(0)
+                print(f"Error during video conversion: {error_output.read().decode(errors='replace')}")
+                return TranscodeJob.FAILED
+            os.replace(temp_path, job.output_path)
+            job.progress = 1.0
+            return TranscodeJob.DONE
+        finally:
+            error_output.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _finish(self, job, state):
+        with self.lock:
+            job.state = state
+            job.finished_at = time.monotonic()
+            job.process = None
+            self.active_jobs.pop(job.job_id, None)
+            self.finished_jobs = (self.finished_jobs + [job])[-20:]
+        print(f"Transcode {job.job_id} {state}: {job.source_path} "
+              f"(queued {job.queue_seconds():.1f} s, transcoding {job.run_seconds():.1f} s)")
+        self.finished_signal.emit(job.job_id, state, job.run_seconds())
+        job.finished.set()
+        if job.on_finished:
+            job.on_finished(job)
@@ -34,7 +34,7 @@ source "$VENV_DIR/bin/activate"
 # Step 4: Install required Python packages
 echo "Installing required Python packages..."
 pip install --upgrade pip
-pip install requests PySide6 adafruit-circuitpython-ads1x15 IPython imageio[ffmpeg]
+pip install requests PySide6 adafruit-circuitpython-ads1x15 IPython imageio[ffmpeg] numpy
 
 # End of script
 echo "Done!"
@@ -1,14 +1,29 @@
 # AlcoholCheck.py
 
 import os
+import time
 from PySide6.QtCore import QTimer, Qt, QDateTime
 from Components.AlcoWall import AlcoWall
 from States.state import State
 from datetime import datetime
 from Constants.GENERALCONSTANTS import COUNTER_FOR_ALCOHOL_MEASURING, DEVICE_ID, ALCOHOL_LEVEL_ALLOWED_ERROR, ERROR_TO_MUCH_TIME_IN_ALCOHOL_CHECK
+from Constants.GENERALCONSTANTS import PAUSE_MEDIA_TRANSFERS_DURING_ALCOHOL_CHECK, BREATH_BASELINE_SECONDS, BREATH_ANALYSIS_INTERVAL
+from Constants.GENERALCONSTANTS import BREATH_EARLY_COMPLETION, BREATH_EARLY_COMPLETION_MIN_CONFIDENCE
 from DatabaseManagement.DataManager import DataManager  # Import the DataManager
+from DatabaseManagement.TransferScheduler import TransferScheduler, MEDIA
+from DatabaseManagement.SessionLog import SessionLog
+from DatabaseManagement.SessionRecorder import SessionRecorder, FLAG_ENDED_EARLY, FLAG_ABORTED
+from sensorReadout.BreathAnalyzer import BreathAnalyzer
+from sensorReadout.AlcoholCalibration import load_calibration
 
 alcoWall = AlcoWall()
+session_log = SessionLog()
+session_recorder = SessionRecorder()
+calibration = load_calibration()
+
+def to_bac(voltage_delta):
+    """Converts a sensor voltage rise to the per mille BAC that is shown."""
+    return calibration.to_bac(voltage_delta) if calibration else voltage_delta
 
 class AlcoholCheck(State):
     def __init__(self):
@@ -21,6 +36,10 @@ class AlcoholCheck(State):
         self.start_time = QDateTime.currentDateTime()
         alcoWall.update_credit(-100)
 
+        # Ad downloads must not slow down anything the customer is waiting for
+        if PAUSE_MEDIA_TRANSFERS_DURING_ALCOHOL_CHECK:
+            TransferScheduler().pause(MEDIA)
+
         self.elapsed_timer = QTimer()
         self.elapsed_timer.timeout.connect(self.check_elapsed_time)
         self.elapsed_timer.start(1000)  # Check every 1 second
@@ -38,7 +57,7 @@ class AlcoholCheck(State):
         alcoWall.workingWidget.alcoholSensorText.hide()
 
         alcoWall.workingWidget.alcoholSensorText.setText("Blow into the alcohol \n sensor until the beep")
-        alcoWall.workingWidget.resultLabelText.setText("Alcohol level: ")
+        alcoWall.workingWidget.resultLabelText.setText("Alcohol level (‰): ")
         alcoWall.workingWidget.lcdNumber.setValue(0)
         alcoWall.workingWidget.lcdCounter.setText(str(self.counterForMeasuring))
 
@@ -46,9 +65,18 @@ class AlcoholCheck(State):
         self.alcohol_local_maximum = alcoWall.get_alcohol_level()
         self.alcohol_local_maximum_updated = False
 
-        self.alcohol_local_maximum_timer = QTimer()
-        self.alcohol_local_maximum_timer.timeout.connect(self.check_local_maximum)
-        self.alcohol_local_maximum_timer.start(300)  # Check every 300 milliseconds
+        # The whole breath curve is analyzed, the samples before the test are its baseline
+        self.breath_analyzer = BreathAnalyzer()
+        self.breath_start_ns = time.monotonic_ns()
+        self.session_id = time.time_ns()
+        self.breath_analysis = None
+        self.breath_decided = False
+        self.ended_early = False
+        alcoWall.alcohol_baseline = None
+
+        self.breath_analysis_timer = QTimer()
+        self.breath_analysis_timer.timeout.connect(self.analyze_breath)
+        self.breath_analysis_timer.start(BREATH_ANALYSIS_INTERVAL)
         alcoWall.workingWidget.play_video('Media/videos/beer1.mp4')
 
         # Create an instance of DataManager
@@ -60,14 +88,42 @@ class AlcoholCheck(State):
                 file.write("AlcoholCheck")
         except FileNotFoundError:
             pass
+        alcoWall.state_changed.emit("AlcoholCheck")
 
     def handle_successful(self):
         """
         Handles the successful detection of alcohol levels.
         """
+        self.stop_timers()
+        self.log_session()
+        self.record_session(FLAG_ENDED_EARLY if self.ended_early else 0)
+        TransferScheduler().resume(MEDIA)
         from States.AlcoholChecked import AlcoholChecked
         return AlcoholChecked()  # Transition to AlcoholChecked state
 
+    def stop_timers(self):
+        """Stops all timers of this state, so nothing fires once it is left."""
+        self.elapsed_timer.stop()
+        self.counterTimer.stop()
+        self.breath_analysis_timer.stop()
+
+    def log_session(self):
+        """Records how long this check took and prints the duration distribution."""
+        duration = (time.monotonic_ns() - self.breath_start_ns) / 1e9
+        analysis = self.breath_analysis
+        session_log.record(duration, self.ended_early,
+                           level=analysis.level if analysis else None,
+                           confidence=round(analysis.confidence, 3) if analysis else None)
+        session_log.print_stats()
+
+    def record_session(self, flags):
+        """Stores the raw samples of this check, including the baseline before it."""
+        samples = alcoWall.get_alcohol_window(since_ns=self.breath_start_ns - int(BREATH_BASELINE_SECONDS * 1e9))
+        if samples is None:
+            return
+        level = alcoWall.alcohol_level_to_show if not flags & FLAG_ABORTED else None
+        session_recorder.record(self.session_id, self.breath_start_ns, samples, level=level, flags=flags)
+
     def decreaseCounter(self):
         self.counterForMeasuring -= 1
         alcoWall.workingWidget.lcdCounter.setText(str(self.counterForMeasuring))
@@ -86,6 +142,9 @@ class AlcoholCheck(State):
         """
         Handles errors during the alcohol check process.
         """
+        self.stop_timers()
+        self.record_session(FLAG_ABORTED)
+        TransferScheduler().resume(MEDIA)
         from States.InitialState import InitialState
         return InitialState()
 
@@ -133,6 +192,38 @@ class AlcoholCheck(State):
         if elapsed >= ERROR_TO_MUCH_TIME_IN_ALCOHOL_CHECK:  # 20 seconds
             alcoWall.handle_error()
 
+    def analyze_breath(self):
+        """
+        Analyzes the breath curve recorded since the start of the test and shows the
+        reading. Once the curve is decided the reading is locked in.
+        """
+        if self.breath_decided:
+            return
+        samples = alcoWall.get_alcohol_window(since_ns=self.breath_start_ns - int(BREATH_BASELINE_SECONDS * 1e9))
+        if samples is None:
+            self.check_local_maximum()  # No streamed samples, only the latest value is known
+            return
+        analysis = self.breath_analyzer.analyze(samples, self.breath_start_ns)
+        if analysis is None:
+            return
+        self.breath_analysis = analysis
+        alcoWall.alcohol_baseline = analysis.baseline  # AlcoholChecked waits for the sensor to return to it
+        alcoWall.alcohol_level_to_show = to_bac(analysis.level)
+        alcoWall.workingWidget.lcdNumber.setValue(alcoWall.alcohol_level_to_show)
+        if analysis.decided:
+            self.breath_decided = True
+            self.on_breath_decided(analysis)
+
+    def on_breath_decided(self, analysis):
+        """
+        Called once when the breath curve is decided, the shown reading does not change after this.
+        """
+        print(f"Breath decided after {(time.monotonic_ns() - self.breath_start_ns) / 1e9:.1f} s: {analysis}")
+        # The countdown stays the ceiling, a stable peak with enough confidence ends the check right away
+        if BREATH_EARLY_COMPLETION and analysis.confidence >= BREATH_EARLY_COMPLETION_MIN_CONFIDENCE:
+            self.ended_early = True
+            alcoWall.handle_successful()
+
     def check_local_maximum(self):
         """
         Checks and updates the local maximum alcohol level detected.
@@ -145,6 +236,6 @@ class AlcoholCheck(State):
             self.alcohol_local_maximum_updated = False
 
         if self.alcohol_local_maximum - self.alcohol_local_starting_value > ALCOHOL_LEVEL_ALLOWED_ERROR:
-            alcoWall.alcohol_level_to_show = self.alcohol_local_maximum - self.alcohol_local_starting_value
+            alcoWall.alcohol_level_to_show = to_bac(self.alcohol_local_maximum - self.alcohol_local_starting_value)
 
         alcoWall.workingWidget.lcdNumber.setValue(alcoWall.alcohol_level_to_show)
@@ -1,11 +1,16 @@
 # AlcoholChecked.py
 
 import os
+import time
+import numpy as np
 from PySide6.QtCore import QTimer, Qt
 from Components.AlcoWall import AlcoWall
 from States.state import State
 from datetime import datetime, timedelta
 from Constants.GENERALCONSTANTS import TIME_IN_ALCOHOL_CHECKED_STATE_FOR_ALCOHOL_SENSOR_COOLDOWN, DEVICE_ID
+from Constants.GENERALCONSTANTS import ALCOHOL_SENSOR_COOLDOWN_MIN_SECONDS, ALCOHOL_SENSOR_COOLDOWN_MAX_SECONDS
+from Constants.GENERALCONSTANTS import ALCOHOL_SENSOR_COOLDOWN_TOLERANCE, ALCOHOL_SENSOR_COOLDOWN_WINDOW_SECONDS
+from Constants.GENERALCONSTANTS import ALCOHOL_SENSOR_COOLDOWN_CHECK_INTERVAL
 from PySide6.QtGui import QFontMetrics, QFont
 from DatabaseManagement.DataManager import DataManager  # Import DataManager
 
@@ -15,20 +20,22 @@ class AlcoholChecked(State):
     def __init__(self):
         """
         Initializes the AlcoholChecked state, hides unnecessary UI elements,
-        and sets up a timer for transitioning back to the initial state.
+        and sets up a timer that transitions back to the initial state once the
+        alcohol sensor has recovered.
         """
         self.change_current_state_file()
         alcoWall.video_widget.hide()
         alcoWall.backgroundImageLabel.hide()
         alcoWall.workingWidget.show()
+        self.cooldown_start = time.monotonic()
         self.alcohol_checked_timer = QTimer()
-        self.alcohol_checked_timer.timeout.connect(self.check_next_state)
-        self.alcohol_checked_timer.start(TIME_IN_ALCOHOL_CHECKED_STATE_FOR_ALCOHOL_SENSOR_COOLDOWN * 1000)  # Convert seconds to milliseconds
+        self.alcohol_checked_timer.timeout.connect(self.check_cooldown)
+        self.alcohol_checked_timer.start(ALCOHOL_SENSOR_COOLDOWN_CHECK_INTERVAL)
         alcoWall.workingWidget.lcdNumber.setValue(alcoWall.alcohol_level_to_show)
         alcoWall.alcohol_level_to_show = 0
         alcoWall.update_alcohol_level(-1)
         alcoWall.workingWidget.alcoholSensorText.setText("")
-        alcoWall.workingWidget.resultLabelText.setText("Alcohol level: ")
+        alcoWall.workingWidget.resultLabelText.setText("Alcohol level (‰): ")
         alcoWall.workingWidget.lcdCounter.setText("")
         alcoWall.workingWidget.alcoholSensorText.hide()
 
@@ -41,6 +48,7 @@ class AlcoholChecked(State):
                 file.write("AlcoholChecked")
         except FileNotFoundError:
             pass
+        alcoWall.state_changed.emit("AlcoholChecked")
     def get_fun_fact(self):
         """
         Fetches a fun fact using DataManager and displays it on the funFactText widget with dynamic font size adjustment.
@@ -97,6 +105,38 @@ class AlcoholChecked(State):
         from States.InitialState import InitialState
         return InitialState()
 
+    def sensor_recovered(self):
+        """
+        Returns True if the recent sensor signal is back within tolerance of the
+        baseline measured before the test, or None if that cannot be told.
+        """
+        if alcoWall.alcohol_baseline is None:
+            return None
+        samples = alcoWall.get_alcohol_window(seconds=ALCOHOL_SENSOR_COOLDOWN_WINDOW_SECONDS)
+        if samples is None or len(samples) == 0:
+            return None
+        recent = float(np.median(samples['voltage']))
+        return abs(recent - alcoWall.alcohol_baseline) <= ALCOHOL_SENSOR_COOLDOWN_TOLERANCE
+
+    def check_cooldown(self):
+        """
+        Ends the cooldown once the sensor has recovered, bounded by the minimum and
+        maximum cooldown. Without a baseline the fixed cooldown is used.
+        """
+        elapsed = time.monotonic() - self.cooldown_start
+        if elapsed < ALCOHOL_SENSOR_COOLDOWN_MIN_SECONDS:
+            return
+        recovered = self.sensor_recovered()
+        if recovered is None:
+            done = elapsed >= TIME_IN_ALCOHOL_CHECKED_STATE_FOR_ALCOHOL_SENSOR_COOLDOWN
+        else:
+            done = recovered or elapsed >= ALCOHOL_SENSOR_COOLDOWN_MAX_SECONDS
+            if done and not recovered:
+                print(f"Alcohol sensor did not recover within {ALCOHOL_SENSOR_COOLDOWN_MAX_SECONDS} s")
+        if done:
+            print(f"Alcohol sensor cooldown took {elapsed:.1f} s")
+            self.check_next_state()
+
     def check_next_state(self):
         """
         Checks for errors and proceeds to transition states if no errors are found.
@@ -6,9 +6,8 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
 
     alcoWall = AlcoWall()
-    alcoWall.data_manager.ad_url_signal.connect(alcoWall.get_ad_url)
     alcoWall.data_manager.fun_fact_signal.connect(alcoWall.get_fun_fact)
-    alcoWall.data_manager.get_ad_url()
+    alcoWall.data_manager.get_campaign_manifest()
     alcoWall.data_manager.get_fun_fact()
     alcoWall.setStyleSheet("QMainWindow { background-color: black; }")
     alcoWall.video_widget.setStyleSheet("QVideoWidget { background-color: black; }")
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import numpy as np
+from Constants.GENERALCONSTANTS import ALCOHOL_CALIBRATION_FILE, ALCOHOL_CALIBRATION_LUT_SIZE
+
+class AlcoholCalibration:
+    """
+    Converts sensor voltage rises into blood alcohol (per mille).
+
+    The calibration table (voltage delta -> BAC points, plus a reference temperature and
+    the relative sensitivity change per degree) is read once and compiled into a dense
+    lookup table, so converting any number of readings is one vectorized index operation.
+    Deltas beyond the table are clamped to its last point.
+    """
+    def __init__(self, calibration_file=ALCOHOL_CALIBRATION_FILE, lut_size=ALCOHOL_CALIBRATION_LUT_SIZE):
+        self.reference_temperature = 20.0
+        self.temperature_coefficient = 0.0
+        self.voltage_deltas, self.bac_values = self.load(calibration_file)
+        self.compile(lut_size)
+
+    def load(self, calibration_file):
+        """Reads the table, parameters are given in comment lines as name=value."""
+        points = []
+        with open(calibration_file, 'r', newline='') as file:
+            rows = csv.reader(line for line in file if not self.read_parameter(line))
+            next(rows)  # Header
+            for row in rows:
+                if row:
+                    points.append((float(row[0]), float(row[1])))
+        points.sort()
+        voltage_deltas = np.array([point[0] for point in points])
+        if len(np.unique(voltage_deltas)) < 2 or voltage_deltas[-1] <= 0:
+            raise ValueError("the table needs at least two distinct voltage deltas, up to a positive one")
+        bac_values = np.maximum.accumulate(np.array([point[1] for point in points]))  # Must not decrease
+        return voltage_deltas, bac_values
+
+    def read_parameter(self, line):
+        """Returns True for comment lines, reads the parameters found in them."""
+        if not line.startswith('#'):
+            return False
+        name, _, value = line[1:].partition('=')
+        name = name.strip()
+        if name in ("reference_temperature", "temperature_coefficient"):
+            setattr(self, name, float(value))
+        return True
+
+    def compile(self, lut_size):
+        self.max_delta = float(self.voltage_deltas[-1])
+        self.lut_scale = (lut_size - 1) / self.max_delta
+        self.lut = np.interp(np.linspace(0, self.max_delta, lut_size), self.voltage_deltas, self.bac_values)
+
+    def temperature_factor(self, temperature):
+        if temperature is None:
+            return 1.0
+        return 1 + self.temperature_coefficient * (temperature - self.reference_temperature)
+
+    def to_bac(self, voltage_delta, temperature=None):
+        """
+        Converts a voltage rise (scalar or array) measured at `temperature` (degrees C,
+        None for the reference temperature) to per mille BAC.
+        """
+        corrected = np.asarray(voltage_delta, dtype=np.float64) / self.temperature_factor(temperature)
+        indexes = np.clip(np.rint(corrected * self.lut_scale), 0, len(self.lut) - 1).astype(np.intp)
+        bac = self.lut[indexes]
+        return float(bac) if bac.ndim == 0 else bac
+
+def load_calibration(calibration_file=ALCOHOL_CALIBRATION_FILE):
+    """Returns the calibration of this device, or None if its table is missing or broken."""
+    try:
+        return AlcoholCalibration(calibration_file)
+    except (OSError, ValueError, IndexError, StopIteration) as e:
+        print(f"Cannot load alcohol calibration {calibration_file}, showing raw voltages: {e}")
+        return None
+
+def fit_table(voltage_deltas, reference_bac, temperatures, reference_temperature=20.0, knots=12):
+    """
+    Fits a monotonic calibration table to measured (voltage delta, reference BAC,
+    temperature) triples. The temperature coefficient is found by a grid search, for
+    each candidate the table is the per-bin mean on quantile knots.
+    Returns (table points, temperature coefficient, RMS error in per mille).
+    """
+    voltage_deltas, reference_bac, temperatures = map(np.asarray, (voltage_deltas, reference_bac, temperatures))
+    best = None
+    for coefficient in np.linspace(-0.03, 0.03, 61):
+        corrected = voltage_deltas / (1 + coefficient * (temperatures - reference_temperature))
+        edges = np.unique(np.quantile(corrected, np.linspace(0, 1, knots + 1)))
+        bins = np.clip(np.searchsorted(edges, corrected, side='right') - 1, 0, len(edges) - 2)
+        counts = np.bincount(bins, minlength=len(edges) - 1)
+        used = counts > 0
+        x = (np.bincount(bins, corrected, minlength=len(edges) - 1)[used] / counts[used])
+        y = np.maximum.accumulate(np.bincount(bins, reference_bac, minlength=len(edges) - 1)[used] / counts[used])
+        x, y = np.concatenate(([0.0], x)), np.concatenate(([0.0], np.maximum(y, 0)))
+        error = float(np.sqrt(np.mean((np.interp(corrected, x, y) - reference_bac) ** 2)))
+        if best is None or error < best[2]:
+            best = (list(zip(x.tolist(), y.tolist())), float(coefficient), error)
+    return best
+
+def write_table(calibration_file, points, temperature_coefficient, reference_temperature=20.0):
+    with open(calibration_file, 'w', newline='') as file:
+        file.write("# Alcohol sensor calibration: sensor voltage rise over the baseline -> blood alcohol in per mille.\n")
+        file.write(f"# reference_temperature={reference_temperature}\n")
+        file.write(f"# temperature_coefficient={temperature_coefficient:.4f}\n")
+        writer = csv.writer(file)
+        writer.writerow(("voltage_delta", "bac_permille"))
+        for voltage_delta, bac in points:
+            writer.writerow((round(voltage_delta, 4), round(bac, 3)))
+
+def main():
+    """
+    Fits the calibration table from recorded sessions. The reference file is a CSV
+    with session_id,reference_bac,temperature rows, one per breath of a calibration
+    run measured with a reference breathalyzer.
+    """
+    from DatabaseManagement.SessionRecorder import SessionRecorder
+    from sensorReadout.BreathAnalyzer import BreathAnalyzer
+
+    parser = argparse.ArgumentParser(description="Fit the alcohol sensor calibration from recorded sessions")
+    parser.add_argument("references", help="CSV with session_id,reference_bac,temperature rows")
+    parser.add_argument("--output", default=ALCOHOL_CALIBRATION_FILE)
+    parser.add_argument("--reference-temperature", type=float, default=20.0)
+    args = parser.parse_args()
+
+    recorder = SessionRecorder()
+    analyzer = BreathAnalyzer()
+    deltas, references, temperatures = [], [], []
+    with open(args.references, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            session = recorder.load_session(int(row["session_id"]))
+            if session is None:
+                print(f"Session {row['session_id']} is not recorded, skipping")
+                continue
+            entry, samples = session
+            analysis = analyzer.analyze(np.array(samples), int(entry['start_ns']))
+            if analysis is None:
+                continue
+            deltas.append(analysis.level)
+            references.append(float(row["reference_bac"]))
+            temperatures.append(float(row.get("temperature") or args.reference_temperature))
+
+    if len(deltas) < 5:
+        print(f"Only {len(deltas)} usable sessions, at least 5 are needed")
+        return
+    points, coefficient, error = fit_table(deltas, references, temperatures, args.reference_temperature)
+    write_table(args.output, points, coefficient, args.reference_temperature)
+    print(f"Fitted {len(points)} points from {len(deltas)} sessions, temperature coefficient {coefficient:.4f}/C, "
+          f"RMS error {error:.3f} per mille. Written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,152 @@
-import board
 import time
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
 import threading
-from Constants.GENERALCONSTANTS import ALCOHOL_LEVEL_MEASUREMENT_TIME_INTERVAL
+from sensorReadout.SampleRingBuffer import SampleRingBuffer
+from Constants.GENERALCONSTANTS import ALCOHOL_LEVEL_MEASUREMENT_TIME_INTERVAL, ALCOHOL_SENSOR_DATA_RATE, ALCOHOL_SENSOR_GAIN
+from Constants.GENERALCONSTANTS import ALCOHOL_SENSOR_STREAMING, ALCOHOL_SENSOR_SAMPLE_RATE, ALCOHOL_SENSOR_BUFFER_SECONDS
+from Constants.GENERALCONSTANTS import ALCOHOL_SENSOR_PROFILE_RATES, ALCOHOL_SENSOR_I2C_DEVICE
+from sensorReadout.DeviceManager import DeviceManager
+
+# Full scale voltage of the ADS1115 for every programmable gain
+PGA_FULL_SCALE_VOLTAGE = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
 
 class SensorReadException(Exception):
     """Custom exception to signal sensor reading issues."""
     pass
 
+def sample_buffer_capacity(default_sample_rate):
+    """Samples needed to keep ALCOHOL_SENSOR_BUFFER_SECONDS of history at the highest rate any profile uses."""
+    max_rate = max([default_sample_rate] + list(ALCOHOL_SENSOR_PROFILE_RATES.values()))
+    return int(max_rate * ALCOHOL_SENSOR_BUFFER_SECONDS)
+
 class AlcoholSensor:
-    def __init__(self):
+    def __init__(self, streaming=ALCOHOL_SENSOR_STREAMING, sample_rate=ALCOHOL_SENSOR_SAMPLE_RATE, samples=None):
+        """
+        In streaming mode the ADS1115 converts continuously at ALCOHOL_SENSOR_DATA_RATE
+        and every sample is a single register read. Otherwise every sample triggers a
+        single-shot conversion, as before. Samples are kept in self.samples, a new
+        SampleRingBuffer unless a ring is passed in `samples`.
+
+        The sampling rate follows the acquisition profile (the name of the current state,
+        see ALCOHOL_SENSOR_PROFILE_RATES), sample_rate is used for unknown profiles.
+        """
+        self.streaming = streaming
+        self.default_sample_rate = sample_rate if streaming else 1 / ALCOHOL_LEVEL_MEASUREMENT_TIME_INTERVAL
+        self.sample_rate = self.default_sample_rate
+        self.profile = None
+        self.profile_changed = threading.Event()
+        self.stats_lock = threading.Lock()
+        self.profile_stats = {}  # profile -> {"samples", "i2c_seconds", "active_seconds"}
+        self.profile_started_at = time.monotonic()
+
+        self.samples = samples if samples is not None else SampleRingBuffer(sample_buffer_capacity(self.default_sample_rate))
+        self.alcohol_level_lock = threading.Lock()
         # Initialize I2C and ADS1115
         self._initialize_sensor()
         self.set_alcohol_level(0)
     
     def _initialize_sensor(self):
         """
-        Initializes or re-initializes the I2C bus and ADS1115.
+        Initializes or re-initializes the ADS1115 on the I2C bus, which is owned by the
+        DeviceManager. Waits until the bus is available. The hardware libraries are
+        imported here, so subclasses without hardware do not need them.
         """
-        self.i2c = busio.I2C(board.SCL, board.SDA)
-        self.ads = ADS.ADS1115(self.i2c)
-        self.channel = AnalogIn(self.ads, ADS.P0)
+        import board
+        import busio
+        import adafruit_ads1x15.ads1115 as ADS
+        from adafruit_ads1x15.ads1x15 import Mode
+        from adafruit_ads1x15.analog_in import AnalogIn
+
+        self.device_manager = DeviceManager()
+        self.device_manager.register(ALCOHOL_SENSOR_I2C_DEVICE, ALCOHOL_SENSOR_I2C_DEVICE,
+                                     lambda path: busio.I2C(board.SCL, board.SDA), closer=lambda i2c: i2c.deinit())
+        self.volts_per_count = PGA_FULL_SCALE_VOLTAGE[ALCOHOL_SENSOR_GAIN] / 32767
+        mode = Mode.CONTINUOUS if self.streaming else Mode.SINGLE
+        while True:
+            self.i2c = self.device_manager.acquire(ALCOHOL_SENSOR_I2C_DEVICE)
+            try:
+                self.ads = ADS.ADS1115(self.i2c, gain=ALCOHOL_SENSOR_GAIN, data_rate=ALCOHOL_SENSOR_DATA_RATE, mode=mode)
+                self.channel = AnalogIn(self.ads, ADS.P0)
+                return
+            except (OSError, ValueError) as e:
+                # The bus is there but the ADS1115 does not answer, retried with backoff
+                self.device_manager.report_failure(ALCOHOL_SENSOR_I2C_DEVICE, str(e))
+
+    def _reinitialize_sensor(self, reason):
+        """Hands the failed I2C bus back to the DeviceManager and waits for it to be reopened."""
+        self.device_manager.report_failure(ALCOHOL_SENSOR_I2C_DEVICE, reason)
+        self._initialize_sensor()
+
+    def read_raw(self):
+        """Returns the raw ADS1115 conversion result of the sensor channel."""
+        return self.channel.value
 
     def measure(self):
         """
-        Measures the analog value and voltage from the sensor.
+        Measures the analog value and voltage from the sensor with one conversion read
+        and stores the timestamped sample.
         Raises a SensorReadException if reading fails.
         """
+        read_started = time.perf_counter()
         try:
-            analog_value = self.channel.value
-            voltage = self.channel.voltage
-            self.set_alcohol_level(voltage)
-            return analog_value, voltage
+            analog_value = self.read_raw()
         except Exception as e:
             # Raise a custom exception so we can handle sensor failures gracefully
             raise SensorReadException(f"Failed to read sensor data: {e}") from e
+        finally:
+            self._count_sample(time.perf_counter() - read_started)
+        # Same conversion AnalogIn.voltage does, without a second I2C read
+        voltage = analog_value * self.volts_per_count
+        self.samples.append(time.monotonic_ns(), analog_value, voltage)
+        self.set_alcohol_level(voltage)
+        return analog_value, voltage
     
-    def run(self, interval=ALCOHOL_LEVEL_MEASUREMENT_TIME_INTERVAL):
+    def _count_sample(self, i2c_seconds):
+        with self.stats_lock:
+            stats = self.profile_stats.setdefault(self.profile, dict(samples=0, i2c_seconds=0.0, active_seconds=0.0))
+            stats["samples"] += 1
+            stats["i2c_seconds"] += i2c_seconds
+
+    def set_acquisition_profile(self, profile):
+        """
+        Switches the sampling rate to the one of the profile. Takes effect immediately,
+        the measurement loop is woken up instead of finishing its current sleep.
+        """
+        rate = ALCOHOL_SENSOR_PROFILE_RATES.get(profile, self.default_sample_rate)
+        with self.stats_lock:
+            now = time.monotonic()
+            if self.profile in self.profile_stats:
+                self.profile_stats[self.profile]["active_seconds"] += now - self.profile_started_at
+            self.profile_started_at = now
+            self.profile = profile
+            self.sample_rate = rate
+        self.profile_changed.set()
+        print(f"Alcohol sensor sampling at {rate} Hz for {profile}. Stats: {self.get_acquisition_stats()}")
+
+    def get_acquisition_stats(self):
+        """Returns per profile sample counts, time spent in I2C reads and achieved sample rate."""
+        with self.stats_lock:
+            result = {}
+            for profile, stats in self.profile_stats.items():
+                active_seconds = stats["active_seconds"]
+                if profile == self.profile:
+                    active_seconds += time.monotonic() - self.profile_started_at
+                result[profile] = dict(
+                    samples=stats["samples"],
+                    i2c_seconds=round(stats["i2c_seconds"], 3),
+                    samples_per_second=round(stats["samples"] / active_seconds, 1) if active_seconds else None,
+                )
+            return result
+
+    def run(self, interval=None):
         """
         Runs the measurement loop and continuously measures the sensor data.
-        If a sensor read fails, waits 10 seconds, re-initializes the sensor,
-        then continues reading without crashing the application.
+        Samples are taken on a fixed schedule at the rate of the current acquisition
+        profile (or every `interval` seconds if given), so the time spent on I2C does
+        not add up as drift. If a sensor read fails, the I2C bus is reopened by the
+        DeviceManager as soon as it is back, then reading continues without crashing
+        the application.
         """
+        next_sample_time = time.monotonic()
         try:
             while True:
                 try:
@@ -52,23 +155,33 @@ class AlcoholSensor:
                     # print(f"Analog Value: {analog_value}, Voltage: {voltage}")
                 except SensorReadException as e:
                     print(f"Sensor read error: {e}")
-                    print("Waiting 10 seconds before attempting to reinitialize sensor.")
-                    time.sleep(10)
-                    self._initialize_sensor()
+                    self._reinitialize_sensor(str(e))
+                    next_sample_time = time.monotonic()
 
-                time.sleep(interval)
+                next_sample_time += interval or 1 / self.sample_rate
+                delay = next_sample_time - time.monotonic()
+                if delay > 0 and self.profile_changed.wait(delay):
+                    # New rate, restart the schedule from now
+                    self.profile_changed.clear()
+                    next_sample_time = time.monotonic()
+                elif delay <= 0:
+                    next_sample_time = time.monotonic()  # Fell behind, do not try to catch up
         except KeyboardInterrupt:
             print("Measurement stopped by user.")
 
     def get_alcohol_level(self):
         """Returns the last measured alcohol level in a thread-safe manner."""
-        with threading.Lock():
+        with self.alcohol_level_lock:
             return self.alcohol_level
         
     def set_alcohol_level(self, alcohol_level):
         """Sets the alcohol level value in a thread-safe manner."""
-        with threading.Lock():
+        with self.alcohol_level_lock:
             self.alcohol_level = alcohol_level
+
+    def get_samples(self, seconds=None):
+        """Returns buffered samples (t_ns, raw, voltage) of the last `seconds`, or all of them."""
+        return self.samples.window(seconds) if seconds is not None else self.samples.snapshot()
     
     def update_alcohol_level(self):
         """
@@ -88,4 +201,4 @@ if __name__ == "__main__":
     sensor = AlcoholSensor()
     # Run the sensor measurement loop
     sensor.run()
-#asdfsdaf
\ No newline at end of file
+#asdfsdaf
@@ -0,0 +1,122 @@
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from Constants.GENERALCONSTANTS import ALCOHOL_LEVEL_ALLOWED_ERROR, BREATH_FILTER_WINDOW, BREATH_PLATEAU_SECONDS
+from Constants.GENERALCONSTANTS import BREATH_PLATEAU_TOLERANCE, BREATH_DECLINE_FRACTION
+
+class BreathAnalysis:
+    """Result of analyzing one breath curve. Voltages are relative to the baseline."""
+    def __init__(self, baseline, noise, level, peak_time_ns, plateau, decided, confidence, sample_count):
+        self.baseline = baseline
+        self.noise = noise
+        self.level = level
+        self.peak_time_ns = peak_time_ns
+        self.plateau = plateau
+        self.decided = decided
+        self.confidence = confidence
+        self.sample_count = sample_count
+
+    def __repr__(self):
+        return (f"BreathAnalysis(level={self.level:.3f}, baseline={self.baseline:.3f}, noise={self.noise:.4f}, "
+                f"plateau={self.plateau}, decided={self.decided}, confidence={self.confidence:.2f})")
+
+class BreathAnalyzer:
+    """
+    Vectorized analysis of the sensor curve of one breath test.
+
+    The baseline and its noise are estimated (median and MAD) from the samples taken
+    before the test started, the curve is median filtered, and the reading is the
+    filtered peak above the baseline. The curve is decided once the peak is at least
+    BREATH_PLATEAU_SECONDS old and the signal since then either stayed within
+    BREATH_PLATEAU_TOLERANCE of it (plateau) or clearly dropped (breath over).
+    """
+    def __init__(self, filter_window=BREATH_FILTER_WINDOW, plateau_seconds=BREATH_PLATEAU_SECONDS,
+                 plateau_tolerance=BREATH_PLATEAU_TOLERANCE, min_rise=ALCOHOL_LEVEL_ALLOWED_ERROR):
+        self.filter_window = filter_window
+        self.plateau_ns = int(plateau_seconds * 1e9)
+        self.plateau_tolerance = plateau_tolerance
+        self.min_rise = min_rise
+
+    def median_filter(self, values):
+        """Sliding median over filter_window samples, edges padded with the edge values."""
+        if len(values) < self.filter_window:
+            return values.astype(np.float64)
+        half = self.filter_window // 2
+        padded = np.pad(values, (half, half), mode='edge')
+        return np.median(sliding_window_view(padded, self.filter_window), axis=1)
+
+    def estimate_baseline(self, voltages):
+        """Returns (baseline, noise): median and robust standard deviation of the voltages."""
+        baseline = float(np.median(voltages))
+        noise = float(1.4826 * np.median(np.abs(voltages - baseline)))
+        return baseline, noise
+
+    def analyze(self, samples, start_ns):
+        """
+        Analyzes samples (SAMPLE_DTYPE array, oldest first) of a test started at the
+        monotonic timestamp start_ns. Samples before start_ns are used as baseline.
+        Returns None if there are no samples after the start yet.
+        """
+        t_ns = samples['t_ns']
+        voltages = samples['voltage'].astype(np.float64)
+        start_index = int(np.searchsorted(t_ns, start_ns))
+        if start_index == len(samples):
+            return None
+
+        # Without a pre-test history use the first samples of the test as baseline
+        baseline_voltages = voltages[:start_index] if start_index else voltages[:self.filter_window]
+        baseline, noise = self.estimate_baseline(baseline_voltages)
+
+        rise = self.median_filter(voltages)[start_index:] - baseline
+        test_t_ns = t_ns[start_index:]
+        peak_index = int(np.argmax(rise))
+        level = float(rise[peak_index])
+        peak_time_ns = int(test_t_ns[peak_index])
+
+        after_peak = rise[peak_index:]
+        plateau = bool(np.all(np.abs(after_peak - level) <= self.plateau_tolerance))
+        declined = bool(after_peak[-1] < level * (1 - BREATH_DECLINE_FRACTION))
+        settled = test_t_ns[-1] - peak_time_ns >= self.plateau_ns
+        decided = level >= self.min_rise and settled and (plateau or declined)
+
+        # Confidence grows with the signal to noise ratio and with how steady the peak was
+        snr = level / max(noise, 1e-4)
+        snr_factor = float(np.clip((snr - 3) / 12, 0, 1))
+        spread = float(np.ptp(after_peak[:max(1, np.searchsorted(test_t_ns[peak_index:], peak_time_ns + self.plateau_ns))]))
+        stability = 1 - min(1.0, spread / max(self.plateau_tolerance, 1e-6) / 2)
+        confidence = snr_factor * (0.5 + 0.5 * stability) if level >= self.min_rise else 0.0
+
+        if level < self.min_rise:
+            level = 0.0
+        return BreathAnalysis(baseline, noise, level, peak_time_ns, plateau, decided, confidence, len(rise))
+
+def synthetic_breath_curve(sample_rate=50, baseline_seconds=5, test_seconds=10, peak=0.8, rise_seconds=2.5, noise=0.01, seed=0):
+    """Returns (samples, start_ns): a baseline followed by a breath rising to `peak` volts and slowly decaying."""
+    from sensorReadout.SampleRingBuffer import SAMPLE_DTYPE
+    rng = np.random.default_rng(seed)
+    count = int((baseline_seconds + test_seconds) * sample_rate)
+    t = np.arange(count) / sample_rate
+    start = baseline_seconds + 1.0  # The customer starts blowing one second into the test
+    curve = np.where(t < start, 0.0, peak * (1 - np.exp(-np.clip(t - start, 0, None) / (rise_seconds / 3))))
+    curve *= np.where(t < start + rise_seconds * 1.5, 1.0, np.exp(-(t - start - rise_seconds * 1.5) / 30))
+    samples = np.zeros(count, dtype=SAMPLE_DTYPE)
+    samples['t_ns'] = (t * 1e9).astype(np.int64)
+    samples['voltage'] = 0.4 + curve + rng.normal(0, noise, count)
+    samples['raw'] = (samples['voltage'] / (4.096 / 32767)).astype(np.int32)
+    return samples, int(baseline_seconds * 1e9)
+
+def benchmark(runs=1000):
+    """Prints the cost of analyzing a full test window against the 60 Hz GUI frame budget."""
+    analyzer = BreathAnalyzer()
+    samples, start_ns = synthetic_breath_curve()
+    result = analyzer.analyze(samples, start_ns)
+    started = time.perf_counter()
+    for _ in range(runs):
+        analyzer.analyze(samples, start_ns)
+    per_window_ms = (time.perf_counter() - started) / runs * 1000
+    print(result)
+    print(f"{len(samples)} samples per window, {per_window_ms:.3f} ms per analysis "
+          f"({per_window_ms / (1000 / 60) * 100:.1f} % of a 60 Hz frame)")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,242 @@
+import collections
+import os
+import random
+import select
+import threading
+import time
+import tty
+from sensorReadout.CcTalkFraming import build_frame, HOST_ADDRESS, SLAVE_ADDRESS, HEADER_LENGTH
+
+ACK = 0
+NAK = 5
+ERROR_INHIBITED_COIN = 2
+
+class CcTalkEmulator:
+    """
+    ccTalk coin validator on a pseudo-terminal, for soak tests without hardware.
+
+    The slave end of the pty is published as the symlink `link_path`, so the real
+    CoinAcceptor(port=link_path) runs against it unchanged, reconnects included. It
+    answers simple poll (254), read buffered credit (229), modify master inhibit (228),
+    request master inhibit (227), modify inhibit status (231) and set accept limit
+    (135), echoing every request like the single wire bus does. Coin bursts, line
+    noise and disconnects can be injected or scripted.
+    """
+    def __init__(self, link_path="/tmp/coin_acceptor_emulator", echo=True, seed=None):
+        self.link_path = link_path
+        self.echo = echo
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.master_fd = None
+        self.slave_fd = None
+        self.stop_event = threading.Event()
+
+        self.event_counter = 0  # 0 until the first event after power-up, then 1..255
+        self.events = collections.deque(maxlen=5)  # (credit code, sorter path), newest first
+        self.accepting = False  # Master inhibit is on after power-up
+        self.inhibit_mask = 0
+        self.accept_limit = None
+        self.pending_noise = 0
+
+        self.stats = dict(polls=0, frames=0, checksum_errors=0, coins=0, rejected=0, reconnects=0)
+        self.insertion_times = collections.deque()  # Monotonic ns of coins not yet read by the host
+        self.connected_at = None
+        self.first_poll_after_connect = None
+
+        self.open()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def open(self):
+        """Creates a new pty and points link_path at it."""
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)  # No line discipline between host and emulator
+        slave_path = os.ttyname(slave_fd)
+        temp_link = f"{self.link_path}.tmp"
+        if os.path.lexists(temp_link):
+            os.remove(temp_link)
+        os.symlink(slave_path, temp_link)
+        os.replace(temp_link, self.link_path)
+        with self.lock:
+            self.master_fd, self.slave_fd = master_fd, slave_fd
+            self.connected_at = time.monotonic()
+            self.first_poll_after_connect = None
+        print(f"ccTalk emulator listening on {self.link_path} -> {slave_path}")
+
+    def close(self):
+        with self.lock:
+            master_fd, slave_fd = self.master_fd, self.slave_fd
+            self.master_fd = self.slave_fd = None
+        if os.path.lexists(self.link_path):
+            os.remove(self.link_path)
+        for fd in (master_fd, slave_fd):
+            if fd is not None:
+                os.close(fd)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.close()
+
+    def disconnect(self, seconds):
+        """Unplugs the validator for `seconds`, it comes back on a new pty."""
+        print(f"ccTalk emulator disconnected for {seconds} s")
+        self.close()
+        if not self.stop_event.wait(seconds):
+            self.open()
+            self.stats["reconnects"] += 1
+
+    def insert_coins(self, credit_codes, sorter_path=1):
+        """Inserts a burst of coins, faster than the host polls if there are several."""
+        with self.lock:
+            for credit_code in credit_codes:
+                if self.accepting and self.inhibit_mask & (1 << (credit_code - 1)):
+                    self.add_event(credit_code, sorter_path)
+                    self.insertion_times.append(time.monotonic_ns())
+                    self.stats["coins"] += 1
+                else:
+                    self.add_event(0, ERROR_INHIBITED_COIN)
+                    self.stats["rejected"] += 1
+
+    def add_event(self, credit, sorter_path):
+        self.event_counter = self.event_counter % 255 + 1
+        self.events.appendleft((credit, sorter_path))
+
+    def inject_noise(self, byte_count):
+        """Prepends random bytes to the next reply."""
+        with self.lock:
+            self.pending_noise += byte_count
+
+    def run_script(self, script):
+        """
+        Plays (seconds after the previous step, action, argument) steps, actions are
+        "coins" (list of credit codes), "noise" (byte count) and "disconnect" (seconds).
+        """
+        actions = {"coins": self.insert_coins, "noise": self.inject_noise, "disconnect": self.disconnect}
+        for delay, action, argument in script:
+            if self.stop_event.wait(delay):
+                return
+            actions[action](argument)
+
+    def run(self):
+        buffer = bytearray()
+        while not self.stop_event.is_set():
+            master_fd = self.master_fd
+            if master_fd is None:
+                buffer.clear()
+                time.sleep(0.01)
+                continue
+            try:
+                readable, _, _ = select.select([master_fd], [], [], 0.05)
+                if not readable:
+                    continue
+                buffer += os.read(master_fd, 1024)
+            except (OSError, ValueError):
+                continue  # Disconnected while waiting
+            self.process(buffer, master_fd)
+
+    def process(self, buffer, master_fd):
+        """Answers every complete request in the buffer, skipping bytes that do not start a valid frame."""
+        while len(buffer) >= HEADER_LENGTH + 1:
+            end = HEADER_LENGTH + buffer[1] + 1
+            if buffer[0] != SLAVE_ADDRESS or buffer[2] != HOST_ADDRESS:
+                del buffer[0]
+                continue
+            if len(buffer) < end:
+                return
+            if sum(buffer[:end]) & 0xFF:
+                self.stats["checksum_errors"] += 1
+                del buffer[0]
+                continue
+            request = bytes(buffer[:end])
+            del buffer[:end]
+            reply = self.answer(request[3], request[HEADER_LENGTH:-1])
+            try:
+                os.write(master_fd, (request if self.echo else b"") + reply)
+            except OSError:
+                return
+
+    def answer(self, command, data):
+        with self.lock:
+            self.stats["frames"] += 1
+            if command == 254:
+                reply = b""
+            elif command == 229:
+                self.stats["polls"] += 1
+                if self.first_poll_after_connect is None:
+                    self.first_poll_after_connect = time.monotonic()
+                events = list(self.events) + [(0, 0)] * (5 - len(self.events))
+                reply = bytes([self.event_counter] + [byte for event in events for byte in event])
+            elif command == 228 and data:
+                self.accepting = bool(data[0] & 1)
+                reply = b""
+            elif command == 227:
+                reply = bytes([1 if self.accepting else 0])
+            elif command == 231 and len(data) == 2:
+                self.inhibit_mask = data[0] | data[1] << 8
+                reply = b""
+            elif command == 135 and data:
+                self.accept_limit = data[0]
+                reply = b""
+            else:
+                return build_frame(NAK, destination=HOST_ADDRESS, source=SLAVE_ADDRESS)
+            noise = bytes(self.random.randrange(256) for _ in range(self.pending_noise))
+            self.pending_noise = 0
+        return noise + build_frame(ACK, reply, destination=HOST_ADDRESS, source=SLAVE_ADDRESS)
+
+    def reconnect_time(self):
+        """Seconds from the pty coming back to the first credit poll on it, None if not polled yet."""
+        with self.lock:
+            if self.first_poll_after_connect is None or self.connected_at is None:
+                return None
+            return self.first_poll_after_connect - self.connected_at
+
+def benchmark(seconds=30):
+    """
+    Runs the real CoinAcceptor against the emulator with coin bursts, line noise and
+    one disconnect, and reports poll throughput, coin latency and reconnect time.
+    """
+    from PySide6.QtCore import Qt
+    from sensorReadout.CoinAcceptor_New import CoinAcceptor
+
+    emulator = CcTalkEmulator(seed=1)
+    acceptor = CoinAcceptor(port=emulator.link_path)
+    coin_codes = {value: code for code, value in acceptor.coin_dic.items()}
+    latencies = []
+    received = []
+
+    def coin_accepted(coin_value, timestamp_ns):
+        received.append(coin_value)
+        with emulator.lock:
+            if emulator.insertion_times:
+                latencies.append((timestamp_ns - emulator.insertion_times.popleft()) / 1e6)
+
+    acceptor.CoinAcceptedSignal.connect(coin_accepted, Qt.DirectConnection)
+    threading.Thread(target=acceptor.get_coin_type, daemon=True).start()
+
+    script = []
+    for second in range(1, seconds - 10):
+        script.append((1, "coins", [coin_codes[50]] * (1 + second % 3)))
+        if second % 7 == 0:
+            script.append((0, "noise", 3))
+    script.append((0.5, "disconnect", 2))
+    script.append((5, "coins", [coin_codes[100]]))
+    started = time.monotonic()
+    emulator.run_script(script)
+    time.sleep(max(0, seconds - (time.monotonic() - started)))
+    elapsed = time.monotonic() - started
+
+    stats = dict(emulator.stats)
+    emulator.stop()
+    reconnect_time = emulator.reconnect_time()
+    print(f"Poll throughput: {stats['polls'] / elapsed:.1f} credit polls/s ({stats['frames']} frames in {elapsed:.1f} s)")
+    if latencies:
+        latencies.sort()
+        print(f"Coin latency: median {latencies[len(latencies) // 2]:.1f} ms, max {latencies[-1]:.1f} ms")
+    print(f"Coins inserted {stats['coins']}, credited {len(received)}, lost {stats['coins'] - len(received)}")
+    print(f"Reconnect: {stats['reconnects']} disconnects, first poll "
+          f"{'never' if reconnect_time is None else f'{reconnect_time:.2f} s'} after the device came back")
+    print(f"Coin acceptor stats: {acceptor.get_coin_stats()}")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,193 @@
+import time
+import serial
+
+HOST_ADDRESS = 1
+SLAVE_ADDRESS = 2
+HEADER_LENGTH = 4  # destination, data length, source, header (command or 0 for a reply)
+MAX_FRAME_LENGTH = HEADER_LENGTH + 255 + 1
+
+def build_frame(code, data=b"", destination=SLAVE_ADDRESS, source=HOST_ADDRESS):
+    """Returns the immutable ccTalk frame of a command, with the simple 8 bit checksum."""
+    body = bytes((destination, len(data), source, code)) + bytes(data)
+    return body + bytes(((-sum(body)) & 0xFF,))
+
+class CcTalkLink:
+    """
+    Request/reply transport for one ccTalk slave on a serial port.
+
+    Requests are prebuilt frames. Replies are read into one reusable buffer and
+    returned as a memoryview of their data bytes, valid until the next transact().
+    Only a reply that directly follows the local echo of the request is accepted, so
+    a late reply to an earlier request is never taken for the current one. After a
+    missing echo, a timeout or a bad checksum the input is flushed and the request is
+    sent again. Nothing is flushed on the normal path.
+    """
+    def __init__(self, serial_object, echo=True, host_address=HOST_ADDRESS, slave_address=SLAVE_ADDRESS):
+        self.serial_object = serial_object
+        self.serial_object.timeout = 1
+        self.serial_object.inter_byte_timeout = 0.1  # Should be 0.05 but Linux doesn't support it
+        self.echo = echo
+        self.host_address = host_address
+        self.slave_address = slave_address
+        self.buffer = bytearray(2 * MAX_FRAME_LENGTH)  # Stale bytes, echo and reply
+        self.view = memoryview(self.buffer)
+        self.stats = dict(requests=0, retries=0, timeouts=0, checksum_errors=0, resyncs=0, length_errors=0)
+
+    def transact(self, frame, reply_length=-1, retries=1):
+        """
+        Sends a request frame and returns the data of the reply as a memoryview, or None
+        if no valid reply arrived. reply_length is the expected number of data bytes,
+        -1 if it is not known in advance. A request without a valid reply is sent
+        again up to `retries` times.
+        """
+        for attempt in range(retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+            self.stats["requests"] += 1
+            self.serial_object.write(frame)
+            expected = len(frame) if self.echo else 0
+            expected += HEADER_LENGTH + reply_length + 1 if reply_length >= 0 else HEADER_LENGTH
+            offset = self.find_reply(frame, self.read_into(0, expected))
+            if offset is not None:
+                break
+            self.resync()
+        else:
+            return None
+
+        data_length = self.buffer[offset + 1]
+        if reply_length >= 0 and data_length != reply_length:
+            self.stats["length_errors"] += 1
+            print(f"Expected {reply_length} bytes but received {data_length}")
+            return None
+        return self.view[offset + HEADER_LENGTH:offset + HEADER_LENGTH + data_length]
+
+    def read_into(self, position, length):
+        """Reads up to length bytes into the buffer at position, returns the number read."""
+        return self.serial_object.readinto(self.view[position:position + length]) or 0
+
+    def read_until(self, end, received):
+        """Reads the missing bytes up to buffer position end, returns the bytes received."""
+        if received < end:
+            received += self.read_into(received, end - received)
+        return received
+
+    def is_reply_header(self, offset):
+        buffer = self.buffer
+        return buffer[offset] == self.host_address and buffer[offset + 2] == self.slave_address and buffer[offset + 3] == 0
+
+    def checksum_ok(self, offset, end):
+        return sum(self.view[offset:end]) & 0xFF == 0
+
+    def find_reply(self, frame, received):
+        """
+        Returns the offset of the reply to frame in the buffer, or None. The reply must
+        start right after the echo of frame (bytes before it are left over from an
+        earlier exchange), or at the start of the buffer if the port has no echo.
+        Missing bytes of the reply are read.
+        """
+        if self.echo:
+            echo = self.buffer.rfind(frame, 0, received)
+            if echo < 0:
+                if received < len(frame):
+                    self.stats["timeouts"] += 1  # Not even the echo came back
+                return None
+            offset = echo + len(frame)
+        else:
+            offset = 0
+        if offset + MAX_FRAME_LENGTH > len(self.buffer):
+            return None
+
+        received = self.read_until(offset + HEADER_LENGTH, received)
+        if received < offset + HEADER_LENGTH:
+            self.stats["timeouts"] += 1
+            return None
+        if not self.is_reply_header(offset):
+            return None
+        end = offset + HEADER_LENGTH + self.buffer[offset + 1] + 1
+        received = self.read_until(end, received)
+        if received < end:
+            self.stats["timeouts"] += 1
+            return None
+        if not self.checksum_ok(offset, end):
+            self.stats["checksum_errors"] += 1
+            return None
+        return offset
+
+    def resync(self):
+        """Drops whatever is left of a broken exchange, so the next request starts aligned."""
+        self.stats["resyncs"] += 1
+        try:
+            self.serial_object.reset_input_buffer()
+        except serial.SerialException as e:
+            print(f"Failed to flush the ccTalk input: {e}")
+
+class LoopbackSerial:
+    """In-memory serial port answering every request with its echo and a fixed reply, for benchmarks."""
+    def __init__(self, reply):
+        self.reply = bytes(reply)
+        self.pending = b""
+        self.timeout = None
+        self.inter_byte_timeout = None
+
+    def isOpen(self):
+        return True
+
+    def write(self, data):
+        self.pending = bytes(data) + self.reply
+        return len(data)
+
+    def read(self, size):
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        self.pending = b""
+
+    def reset_output_buffer(self):
+        pass
+
+def benchmark(polls=20000):
+    """
+    Compares a credit buffer poll through the old list based path and through
+    CcTalkLink: time per poll and peak traced memory while polling. The loopback port
+    itself allocates the same bytes objects for both.
+    """
+    import gc
+    import tracemalloc
+    from sensorReadout.CoinAcceptor_New import CoinMessenger, send_message_and_get_reply
+
+    reply = build_frame(0, bytes([7, 4, 1, 0, 0, 0, 0, 0, 0, 0, 0]), destination=HOST_ADDRESS, source=SLAVE_ADDRESS)
+    port = LoopbackSerial(reply)
+    messenger = CoinMessenger(port)
+    message = messenger.request_data['read_buffered_credit_or_error_codes']
+    link = CcTalkLink(port)
+    frame = build_frame(message['request_code'])
+
+    def old_poll():
+        return send_message_and_get_reply(port, message)[0]
+
+    def new_poll():
+        return link.transact(frame, message['bytes_expected'])[0]
+
+    for name, poll in (("list based", old_poll), ("CcTalkLink", new_poll)):
+        assert poll() == 7
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(polls):
+            poll()
+        per_poll_us = (time.perf_counter() - started) / polls * 1e6
+
+        tracemalloc.start()
+        for _ in range(1000):
+            poll()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name}: {per_poll_us:.2f} us per poll, {peak_bytes} bytes peak traced memory")
+
+if __name__ == "__main__":
+    benchmark()
@@ -8,6 +8,56 @@ import threading
 
 from serial.tools import list_ports
 from struct import unpack
+from Constants.GENERALCONSTANTS import COIN_POLL_INTERVAL, COIN_EVENT_BUFFER_SIZE, COIN_ACCEPTOR_DEVICE, COIN_MAX_FAILED_POLLS
+from sensorReadout.CcTalkFraming import CcTalkLink
+from sensorReadout.DeviceManager import DeviceManager
+
+# ccTalk error codes reported in the credit buffer (credit code 0)
+CCTALK_ERROR_CODES = {
+    0: "null event",
+    1: "reject coin",
+    2: "inhibited coin",
+    3: "multiple window",
+    4: "wake-up timeout",
+    5: "validation timeout",
+    6: "credit sensor timeout",
+    7: "sorter opto timeout",
+    8: "2nd close coin error",
+    9: "accept gate not ready",
+    10: "credit sensor not ready",
+    11: "sorter not ready",
+    12: "reject coin not cleared",
+    13: "validation sensor not ready",
+    14: "credit sensor blocked",
+    15: "sorter opto blocked",
+    16: "credit sequence error",
+    17: "coin going backwards",
+    18: "coin too fast",
+    19: "coin too slow",
+    20: "C.O.S. mechanism activated",
+    21: "DCE opto timeout",
+    22: "DCE opto not seen",
+    23: "credit sensor reached too early",
+    24: "reject coin (repeated sequential trip)",
+    25: "reject slug",
+    26: "reject sensor blocked",
+    27: "games overload",
+    28: "max. coin meter pulses exceeded",
+    29: "accept gate open not closed",
+    30: "accept gate closed not open",
+    254: "coin return mechanism activated",
+    255: "unspecified alarm code",
+}
+
+def events_since(last_counter, counter):
+    """
+    Number of new events between two event counter values. The counter runs 1..255
+    and wraps to 1, 0 only follows a power-up or reset.
+    """
+    if last_counter == 0:
+        return counter
+    return (counter - last_counter) % 255
+
 #test for ota
 def find_coin_acceptor():
     # Check if the symbolic link exists
@@ -32,7 +82,7 @@ def make_msg(code, data=None, to_slave_addr=2, from_host_addr=1):
     message_sum = 0
     for i in seq:
         message_sum += i
-    end_byte = 256 - (message_sum%256)
+    end_byte = (256 - message_sum % 256) % 256
     message = seq + [end_byte]
     return message
 
@@ -114,7 +164,7 @@ def make_serial_object(tty_port):
                          parity=serial.PARITY_NONE,
                          stopbits=serial.STOPBITS_ONE,
                          bytesize=serial.EIGHTBITS,
-                         xonxoff=True,
+                         xonxoff=False,  # ccTalk is binary, XON/XOFF would swallow 0x11 and 0x13 bytes
                          )
 
 def drop_to_ipython(local_variables, *variables_to_inspect):
@@ -173,10 +223,13 @@ class CoinMessenger(object):
     def __init__(self, serial_object, verbose = False):
         self.credit = 0
         self.serial_object = serial_object
+        self.link = CcTalkLink(serial_object)
         self.request_data = {}
         self.verbose = verbose
         for k, v in list(self.r_info.items()):
-            self.request_data[k] = dict(message=make_msg(v[0]),
+            message = make_msg(v[0])
+            self.request_data[k] = dict(message=message,
+                                        frame=bytes(message),  # Sent as is on every request
                                         request_code=v[0],
                                         bytes_expected=v[1],
                                         bytes_sent=0,
@@ -184,6 +237,37 @@ class CoinMessenger(object):
                                         user_message=k,
                                         )
 
+    def send(self, message):
+        """
+        Sends a request through the framing layer. Returns the reply like
+        send_message_and_get_reply, except that int replies are memoryviews of the
+        reply buffer which stay valid until the next request.
+        """
+        try:
+            if not self.serial_object.isOpen():
+                msg = 'The serial port is not open.'
+                raise UserWarning(msg, (self.serial_object.isOpen()))
+            frame = message.get('frame') or bytes(message['message'])
+            reply_data = self.link.transact(frame, message['bytes_expected'])
+        except Exception as e:
+            print(f"Error sending message: {e}")
+            return False
+
+        if reply_data is None:
+            return False
+        if self.verbose:
+            print("Received {0} bytes:".format(len(reply_data)))
+
+        reply_type = message['type_returned']
+        if reply_type is str:
+            return bytes(reply_data).decode('latin-1')
+        elif reply_type is int:
+            return reply_data
+        elif reply_type is bool:
+            return True
+        else:
+            return list(map(chr, reply_data))
+
     def accept_coins(self, mask=[255,255]):
         """Change accept coin state.
 
@@ -212,7 +296,7 @@ class CoinMessenger(object):
                   )
 
         log(ph, verbose=self.verbose)
-        reply_msg = send_message_and_get_reply(self.serial_object, ph, verbose=self.verbose)
+        reply_msg = self.send(ph)
         return reply_msg
 
     def master_inhibit(self, state=True):
@@ -229,7 +313,7 @@ class CoinMessenger(object):
                   user_message='modify_master_inhibit_status_{0}'.format(state),
                   )
         log(ph, verbose=self.verbose)
-        reply_msg = send_message_and_get_reply(self.serial_object, ph, verbose=self.verbose)
+        reply_msg = self.send(ph)
         return reply_msg
 
     def set_accept_limit(self, coins=1):
@@ -245,7 +329,7 @@ class CoinMessenger(object):
                   user_message='set_accept_limit_{0}'.format(coins),
                   )
         log(ph, verbose=self.verbose)
-        reply_msg = send_message_and_get_reply(self.serial_object, ph, verbose=self.verbose)
+        reply_msg = self.send(ph)
         print(reply_msg)
 
     def read_buffer(self):
@@ -273,7 +357,7 @@ class CoinMessenger(object):
                   user_message='get_coin_id_{0}'.format(slot),
                   )
         log(ph, verbose=self.verbose)
-        reply_msg = send_message_and_get_reply(self.serial_object, ph, verbose=self.verbose)
+        reply_msg = self.send(ph)
         return reply_msg
 
     def modify_coin_id(self, slot, text):
@@ -286,7 +370,7 @@ class CoinMessenger(object):
                   user_message='modify_coin_id_{0}_{1}'.format(slot,text),
                   )
         log(ph, verbose=self.verbose)
-        reply_msg = send_message_and_get_reply(self.serial_object, ph, verbose=self.verbose)
+        reply_msg = self.send(ph)
         return reply_msg
 
     def teach_mode_control(self, slot):
@@ -298,7 +382,7 @@ class CoinMessenger(object):
                   user_message='teach_mode_control_{0}'.format(slot),
                   )
         log(ph, verbose=self.verbose)
-        reply_msg = send_message_and_get_reply(self.serial_object, ph, verbose=self.verbose)
+        reply_msg = self.send(ph)
         return reply_msg
 
     def request(self, request_key):
@@ -308,7 +392,7 @@ class CoinMessenger(object):
             raise NotImplementedError(msg, (request_key))
 
         log(r_dic, verbose=self.verbose)
-        reply_msg = send_message_and_get_reply(self.serial_object, r_dic, verbose=self.verbose)
+        reply_msg = self.send(r_dic)
 
         return reply_msg
       
@@ -318,20 +402,53 @@ import threading
 from PySide6.QtCore import QObject, Signal
 
 class CoinAcceptor(QObject):
-    CoinAcceptedSignal = Signal(int)
-    def __init__(self):
+    CoinAcceptedSignal = Signal(int, object)  # coin value, monotonic ns of the poll that reported it (exceeds a C int)
+    def __init__(self, port=None):
+        """
+        port is the serial device of the coin acceptor, COIN_ACCEPTOR_DEVICE if not given.
+        The connection is owned by the DeviceManager, waits until the device is there.
+        """
         super().__init__()
-        port = find_coin_acceptor()
-        coin_validator_connection = make_serial_object(port)
-        self.coin_messenger = CoinMessenger(coin_validator_connection)
-        self.coin_messenger.set_accept_limit(25)
+        self.port = port or COIN_ACCEPTOR_DEVICE
+        self.device_manager = DeviceManager()
+        self.device_manager.register(self.port, self.port, make_serial_object, closer=lambda connection: connection.close())
+        self.coin_messenger = None
+        self.open_connection()
 
         # Maps coin codes (the second byte from coin acceptor) to integer values
         self.coin_dic = {4: 100, 1: 10, 2: 20, 3: 50, 5: 200, 6: 500}
         
         self.credit = 0
         self.credit_lock = threading.Lock()
-        
+
+        self.last_event_counter = None
+        self.stats_lock = threading.Lock()
+        self.stats = dict(polls=0, poll_seconds=0.0, max_poll_gap=0.0, coins=0, coin_value=0,
+                          events_lost=0, unknown_coins=0, errors={})
+        self.last_poll_at = None
+
+    def open_connection(self, timeout=None):
+        """Takes the open serial connection from the device manager. Returns False on timeout."""
+        connection = self.device_manager.acquire(self.port, timeout)
+        if connection is None:
+            return False
+        self.coin_messenger = CoinMessenger(connection)
+        self.coin_messenger.set_accept_limit(25)
+        # A validator that is still enabled (e.g. after an app restart) must not take
+        # coins before polling starts, they would never be credited
+        self.reject_all_coins()
+        return True
+
+    def start_accepting(self):
+        """
+        Takes the current event counter as the starting point, then enables all coins.
+        The validator is inhibited until then, so no coin is counted before the starting point.
+        """
+        status = self.coin_messenger.request('read_buffered_credit_or_error_codes')
+        self.last_event_counter = status[0] if status else None
+        self.coin_messenger.accept_coins(mask=[255, 255])
+        self.accept_all_coins()
+
     def reject_all_coins(self):
         """Disables coin acceptance."""
         try:
@@ -361,64 +478,124 @@ class CoinAcceptor(QObject):
         with self.credit_lock:
             self.credit = amount
 
+    def get_coin_stats(self):
+        """
+        Returns poll and coin counters. A coin is reported at most max_poll_gap after it
+        was accepted, events_lost counts events that overflowed the validator buffer.
+        """
+        with self.stats_lock:
+            stats = dict(self.stats, errors=dict(self.stats["errors"]))
+        poll_seconds = stats.pop("poll_seconds")
+        stats["mean_poll_ms"] = round(poll_seconds / stats["polls"] * 1000, 2) if stats["polls"] else None
+        stats["max_poll_gap_ms"] = round(stats.pop("max_poll_gap") * 1000, 1)
+        events = stats["coins"] + stats["unknown_coins"] + stats["events_lost"] + sum(stats["errors"].values())
+        stats["lost_rate"] = stats["events_lost"] / events if events else 0.0
+        return stats
+
+    def _count_poll(self, poll_started, poll_finished):
+        with self.stats_lock:
+            self.stats["polls"] += 1
+            self.stats["poll_seconds"] += poll_finished - poll_started
+            if self.last_poll_at is not None:
+                self.stats["max_poll_gap"] = max(self.stats["max_poll_gap"], poll_finished - self.last_poll_at)
+            self.last_poll_at = poll_finished
+
+    def process_buffered_events(self, status, timestamp_ns):
+        """
+        Handles every event the validator buffered since the last poll, oldest first.
+        status is the reply to read_buffered_credit_or_error_codes: the event counter
+        followed by (credit, sorter path) pairs, newest first. Credit 0 means the second
+        byte is an error code.
+        """
+        counter = status[0]
+        if self.last_event_counter is None:
+            # Events from before we started polling were never ours to credit
+            self.last_event_counter = counter
+            return
+        if counter == self.last_event_counter:
+            return
+        if counter == 0:
+            print("Coin acceptor was reset, event counter restarted")
+            self.last_event_counter = 0
+            return
+
+        new_events = events_since(self.last_event_counter, counter)
+        self.last_event_counter = counter
+        buffered_events = min(new_events, COIN_EVENT_BUFFER_SIZE, (len(status) - 1) // 2)
+        if new_events > buffered_events:
+            print(f"Coin acceptor buffer overflowed, {new_events - buffered_events} events lost")
+            with self.stats_lock:
+                self.stats["events_lost"] += new_events - buffered_events
+
+        for event in range(buffered_events - 1, -1, -1):
+            credit, sorter_path = status[1 + 2 * event], status[2 + 2 * event]
+            if credit == 0:
+                self.handle_error_code(sorter_path)
+                continue
+            coin_value = self.coin_dic.get(credit)
+            if coin_value:
+                print(f"Coin accepted: Code {credit}, Value {coin_value}, Sorter path {sorter_path}")
+                with self.stats_lock:
+                    self.stats["coins"] += 1
+                    self.stats["coin_value"] += coin_value
+                self.CoinAcceptedSignal.emit(coin_value, timestamp_ns)
+            else:
+                print(f"Unknown coin code received: {credit}")
+                with self.stats_lock:
+                    self.stats["unknown_coins"] += 1
+
+    def handle_error_code(self, error_code):
+        if error_code == 0:
+            return
+        print(f"Coin acceptor error {error_code}: {CCTALK_ERROR_CODES.get(error_code, 'unknown error')}")
+        with self.stats_lock:
+            self.stats["errors"][error_code] = self.stats["errors"].get(error_code, 0) + 1
+
     def get_coin_type(self):
         """
-        Continuously polls the coin acceptor for new coins. Handles reconnection if the device becomes unresponsive.
+        Continuously polls the coin acceptor for new coins every COIN_POLL_INTERVAL and
+        processes every buffered event. After COIN_MAX_FAILED_POLLS unanswered polls the
+        connection is handed back to the device manager and reopened.
         """
         print("Initializing coin acceptor...")
-        self.coin_messenger.accept_coins(mask=[255, 255])
-        self.accept_all_coins()
+        self.start_accepting()
         print("Coin validator enabled. Waiting for coins...")
-        last_status_number = None
-        status = self.coin_messenger.request('read_buffered_credit_or_error_codes')
-        last_status_number = status[0] if status else last_status_number
-        
+        next_poll_time = time.monotonic()
+        failed_polls = 0
 
         while True:
+            # Read the buffered credit or error codes
+            poll_started = time.monotonic()
             try:
-                # Read the buffered credit or error codes
                 status = self.coin_messenger.request('read_buffered_credit_or_error_codes')
+            except serial.SerialException as e:
+                print(f"Serial exception: {e}")
+                status = False
+
+            if status:
+                failed_polls = 0
+                self._count_poll(poll_started, time.monotonic())
+                self.process_buffered_events(status, time.monotonic_ns())
+            else:
+                failed_polls += 1
                 # Handle invalid or unresponsive hardware
-                if not status:
+                if failed_polls >= COIN_MAX_FAILED_POLLS:
                     print("No response from coin acceptor. Attempting to reconnect...")
                     self.reject_all_coins()
-                    time.sleep(1)  # Brief pause before reconnection attempt
-
-                    # Try reconnecting
-                    port = find_coin_acceptor()
-                    if not port:
-                        print("Unable to find coin acceptor. Retrying...")
-                        time.sleep(3)  # Wait and retry
-                        continue
-
-                    coin_validator_connection = make_serial_object(port)
-                    self.coin_messenger = CoinMessenger(coin_validator_connection)
-                    self.coin_messenger.set_accept_limit(25)
-                    self.coin_messenger.accept_coins(mask=[255, 255])
-                    self.accept_all_coins()
+                    self.device_manager.report_failure(self.port, "no response")
+                    self.open_connection()
+                    self.start_accepting()
                     print("Reconnected to coin acceptor.")
-                    last_status_number = None  # Reset last status
-
-                    continue  # Skip to the next loop iteration
-
-                # Process valid response
-                if len(status) > 1 and status[0] != last_status_number:
-                    last_status_number = status[0]  # Update last status number
-                    coin_code = status[1]
-                    coin_value = self.coin_dic.get(coin_code)
-
-                    if coin_value:
-                        print(f"Coin accepted: Code {coin_code}, Value {coin_value}")
-                        self.CoinAcceptedSignal.emit(coin_value)
-                    else:
-                        print(f"Unknown coin code received: {coin_code}")
-
-                time.sleep(0.5)  # Reduce load on the hardware
-
-            except serial.SerialException as e:
-                print(f"Serial exception: {e}. Reinitializing connection...")
-                time.sleep(2)  # Pause before retrying
-                continue
+                    failed_polls = 0
+                    next_poll_time = time.monotonic()
+                    continue
+
+            next_poll_time += COIN_POLL_INTERVAL
+            delay = next_poll_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_poll_time = time.monotonic()  # Fell behind, do not try to catch up
 
 
 
@@ -0,0 +1,175 @@
+import os
+import random
+import threading
+import time
+from PySide6.QtCore import QObject, Signal
+from Constants.GENERALCONSTANTS import DEVICE_POLL_INTERVAL, DEVICE_BACKOFF_INITIAL, DEVICE_BACKOFF_MAX, DEVICE_BACKOFF_RESET
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+class ManagedDevice:
+    """State of one device node: its open handle and the reconnect backoff."""
+    def __init__(self, name, path, opener, closer):
+        self.name = name
+        self.path = path
+        self.opener = opener
+        self.closer = closer
+        self.handle = None
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.up_since = None
+        self.stats = dict(opens=0, failed_opens=0, downs=0, last_recovery_seconds=None)
+        self.down_since = time.monotonic()
+
+class DeviceManager(QObject):
+    """
+    Owns the handles of the hardware devices and keeps them open.
+
+    Each registered device is a device node (e.g. /dev/coin_acceptor, /dev/i2c-1) with
+    an opener and a closer. A watcher thread opens devices as soon as their node
+    exists. It is woken by udev events when pyudev is installed, otherwise the nodes
+    are polled every DEVICE_POLL_INTERVAL. Users acquire() the open handle and call
+    report_failure() when it stops working: the handle is closed and reopened with
+    jittered exponential backoff. device_up/device_down are emitted on every change.
+    """
+    device_up = Signal(str)
+    device_down = Signal(str)
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+        super().__init__()
+        self.condition = threading.Condition()
+        self.devices = {}
+        self.wake_event = threading.Event()
+        self.udev_observer = self._start_udev_observer()
+        self.watcher = threading.Thread(target=self.run, daemon=True)
+        self.watcher.start()
+        self._initialized = True
+
+    def _start_udev_observer(self):
+        """Wakes the watcher on tty and i2c hotplug events, returns None without pyudev."""
+        if pyudev is None:
+            return None
+        try:
+            monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+            monitor.filter_by('tty')
+            monitor.filter_by('i2c-dev')
+            observer = pyudev.MonitorObserver(monitor, callback=lambda device: self.wake_event.set(), name="udev-observer")
+            observer.daemon = True
+            observer.start()
+            return observer
+        except Exception as e:
+            print(f"udev monitoring unavailable, polling device nodes instead: {e}")
+            return None
+
+    def register(self, name, path, opener, closer=None):
+        """Registers a device, opener(path) returns the handle and closer(handle) releases it."""
+        with self.condition:
+            if name not in self.devices:
+                self.devices[name] = ManagedDevice(name, path, opener, closer)
+        self.wake_event.set()
+
+    def acquire(self, name, timeout=None):
+        """Returns the open handle of the device, waiting up to timeout seconds for it. None on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            device = self.devices[name]
+            while device.handle is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            return device.handle
+
+    def is_up(self, name):
+        with self.condition:
+            return name in self.devices and self.devices[name].handle is not None
+
+    def report_failure(self, name, reason=""):
+        """Closes the handle of a device that stopped working, it is reopened with backoff."""
+        with self.condition:
+            device = self.devices[name]
+            if device.handle is None:
+                return
+            handle = device.handle
+            self._mark_down(device)
+            # A device that worked for a while starts over with the shortest backoff
+            if device.up_since is not None and time.monotonic() - device.up_since > DEVICE_BACKOFF_RESET:
+                device.failures = 0
+            device.failures += 1
+            device.next_attempt = time.monotonic() + self._backoff(device.failures)
+        print(f"Device {name} failed{': ' + reason if reason else ''}, reopening")
+        self._close(device, handle)
+        self.device_down.emit(name)
+        self.wake_event.set()
+
+    def _backoff(self, failures):
+        """Full jitter exponential backoff."""
+        return random.uniform(0, min(DEVICE_BACKOFF_MAX, DEVICE_BACKOFF_INITIAL * 2 ** (failures - 1)))
+
+    def _mark_down(self, device):
+        """Must be called with the condition held."""
+        device.handle = None
+        device.down_since = time.monotonic()
+        device.stats["downs"] += 1
+
+    def _close(self, device, handle):
+        if device.closer is None:
+            return
+        try:
+            device.closer(handle)
+        except Exception as e:
+            print(f"Error closing {device.name}: {e}")
+
+    def run(self):
+        """Watcher loop, opens devices whose node appeared and drops those whose node vanished."""
+        while True:
+            self.wake_event.wait(DEVICE_POLL_INTERVAL)
+            self.wake_event.clear()
+            with self.condition:
+                devices = list(self.devices.values())
+            for device in devices:
+                present = os.path.exists(device.path)
+                if device.handle is not None and not present:
+                    with self.condition:
+                        handle = device.handle
+                        self._mark_down(device)
+                    print(f"Device {device.name} removed")
+                    self._close(device, handle)
+                    self.device_down.emit(device.name)
+                elif device.handle is None and present and time.monotonic() >= device.next_attempt:
+                    self._open(device)
+
+    def _open(self, device):
+        try:
+            handle = device.opener(device.path)
+        except Exception as e:
+            device.failures += 1
+            device.stats["failed_opens"] += 1
+            device.next_attempt = time.monotonic() + self._backoff(device.failures)
+            print(f"Failed to open {device.name} at {device.path}: {e}")
+            return
+        with self.condition:
+            device.handle = handle
+            device.up_since = time.monotonic()
+            device.stats["opens"] += 1
+            device.stats["last_recovery_seconds"] = round(device.up_since - device.down_since, 3)
+            self.condition.notify_all()
+        print(f"Device {device.name} up at {device.path} after {device.stats['last_recovery_seconds']} s")
+        self.device_up.emit(device.name)
+
+    def get_stats(self):
+        with self.condition:
+            return {name: dict(device.stats, up=device.handle is not None, failures=device.failures)
+                    for name, device in self.devices.items()}
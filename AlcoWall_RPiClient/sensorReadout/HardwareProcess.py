@@ -0,0 +1,262 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from PySide6.QtCore import QObject, Signal, Slot, Qt, QSocketNotifier, QCoreApplication
+from sensorReadout.SampleRingBuffer import SharedSampleRing, timestamp_jitter
+from sensorReadout.AlcoholSensor import sample_buffer_capacity
+from Constants.GENERALCONSTANTS import ALCOHOL_SENSOR_STREAMING, ALCOHOL_SENSOR_SAMPLE_RATE, ALCOHOL_LEVEL_MEASUREMENT_TIME_INTERVAL
+from Constants.GENERALCONSTANTS import HARDWARE_PROCESS_COIN_RING_SIZE
+
+# Peripheral names used for readiness
+ALCOHOL_SENSOR = "alcohol_sensor"
+COIN_ACCEPTOR = "coin_acceptor"
+
+# One accepted coin: monotonic ns of the poll that reported it and its value
+COIN_EVENT_DTYPE = np.dtype([('t_ns', '<i8'), ('value', '<i8')])
+
+def hardware_factories(backend):
+    """Returns the alcohol sensor and coin acceptor classes of the "hardware" or "simulated" backend."""
+    if backend == "hardware":
+        from sensorReadout.AlcoholSensor import AlcoholSensor
+        from sensorReadout.CoinAcceptor_New import CoinAcceptor
+    else:
+        from sensorReadout.SimulatedAlcoholSensor import SimulatedAlcoholSensor as AlcoholSensor
+        from sensorReadout.SimulatedCoinAcceptor import SimulatedCoinAcceptor as CoinAcceptor
+    return {ALCOHOL_SENSOR: AlcoholSensor, COIN_ACCEPTOR: CoinAcceptor}
+
+def sample_capacity():
+    """Size of the shared sample ring, the same the AlcoholSensor would allocate for itself."""
+    return sample_buffer_capacity(ALCOHOL_SENSOR_SAMPLE_RATE if ALCOHOL_SENSOR_STREAMING else 1 / ALCOHOL_LEVEL_MEASUREMENT_TIME_INTERVAL)
+
+def run_hardware_process(backend, samples_name, coins_name, lock, events, commands):
+    """Entry point of the hardware process."""
+    samples = SharedSampleRing(sample_capacity(), lock, name=samples_name)
+    coins = SharedSampleRing(HARDWARE_PROCESS_COIN_RING_SIZE, lock, name=coins_name, dtype=COIN_EVENT_DTYPE)
+    HardwareProcess(backend, samples, coins, events).run(commands)
+
+class HardwareProcess:
+    """
+    Runs in the hardware process and owns the alcohol sensor and coin acceptor. Samples
+    go straight into the shared sample ring, coins into the shared coin ring followed
+    by a ("coins",) message on the events pipe. Peripherals are initialized concurrently
+    and reported with ("ready", name) or ("failed", name, error).
+    """
+    def __init__(self, backend, samples, coins, events):
+        self.factories = hardware_factories(backend)
+        self.samples = samples
+        self.coins = coins
+        self.events = events
+        self.events_lock = threading.Lock()  # Messages are sent from several threads
+        self.peripherals = {}
+        self.peripherals_lock = threading.Lock()
+        self.profile = None
+        self.accept_coins = False
+
+    def notify(self, *message):
+        with self.events_lock:
+            self.events.send(message)
+
+    def run(self, commands):
+        """Initializes the peripherals and executes commands of the GUI process until it goes away."""
+        for name, factory in self.factories.items():
+            threading.Thread(target=self.initialize_peripheral, args=(name, factory), daemon=True).start()
+        while True:
+            try:
+                command, *args = commands.recv()
+            except EOFError:
+                break  # The GUI process exited
+            if command == "profile":
+                self.set_acquisition_profile(*args)
+            elif command == "start_coins":
+                self.start_accepting_coins()
+
+    def initialize_peripheral(self, name, factory):
+        started = time.monotonic()
+        try:
+            peripheral = factory(samples=self.samples) if name == ALCOHOL_SENSOR else factory()
+        except Exception as e:
+            self.notify("failed", name, str(e))
+            return
+        print(f"{name} initialized in {time.monotonic() - started:.2f} s (hardware process)")
+        if name == COIN_ACCEPTOR:
+            # Emitted on the polling thread, there is no event loop here
+            peripheral.CoinAcceptedSignal.connect(self.publish_coin, Qt.DirectConnection)
+        with self.peripherals_lock:
+            self.peripherals[name] = peripheral
+            profile, accept_coins = self.profile, self.accept_coins
+        if name == ALCOHOL_SENSOR:
+            if profile is not None:
+                peripheral.set_acquisition_profile(profile)
+            threading.Thread(target=peripheral.run, daemon=True).start()
+        elif accept_coins:
+            threading.Thread(target=peripheral.get_coin_type, daemon=True).start()
+        self.notify("ready", name)
+
+    def set_acquisition_profile(self, profile):
+        with self.peripherals_lock:
+            self.profile = profile
+            sensor = self.peripherals.get(ALCOHOL_SENSOR)
+        if sensor:
+            sensor.set_acquisition_profile(profile)
+
+    def start_accepting_coins(self):
+        with self.peripherals_lock:
+            if self.accept_coins:
+                return
+            self.accept_coins = True
+            coin_acceptor = self.peripherals.get(COIN_ACCEPTOR)
+        if coin_acceptor:
+            threading.Thread(target=coin_acceptor.get_coin_type, daemon=True).start()
+
+    def publish_coin(self, coin_value, timestamp_ns):
+        self.coins.append(timestamp_ns, coin_value)
+        self.notify("coins")
+
+class HardwareProcessClient(QObject):
+    """
+    GUI process side of the hardware process. Samples are read directly from the
+    shared ring, the events pipe is watched by a QSocketNotifier, so coins and
+    readiness arrive in the Qt event loop without a polling thread. `futures` hold
+    stand-ins with the interface SensorVariableUpdates uses of the real peripherals.
+    """
+    CoinAcceptedSignal = Signal(int, object)  # coin value, monotonic ns of the poll that reported it
+
+    def __init__(self, backend):
+        super().__init__()
+        # Forking a process with Qt threads running is not safe
+        context = multiprocessing.get_context("spawn")
+        lock = context.Lock()
+        self.samples = SharedSampleRing(sample_capacity(), lock)
+        self.coins = SharedSampleRing(HARDWARE_PROCESS_COIN_RING_SIZE, lock, dtype=COIN_EVENT_DTYPE)
+        self.coins_seen = 0
+        self.futures = {ALCOHOL_SENSOR: Future(), COIN_ACCEPTOR: Future()}
+
+        self.events, events_writer = context.Pipe(duplex=False)
+        commands_reader, self.commands = context.Pipe(duplex=False)
+        self.process = context.Process(target=run_hardware_process, name="hardware", daemon=True,
+                                       args=(backend, self.samples.name, self.coins.name, lock, events_writer, commands_reader))
+        self.process.start()
+        events_writer.close()
+        commands_reader.close()
+
+        self.notifier = QSocketNotifier(self.events.fileno(), QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.read_events)
+        if QCoreApplication.instance() is not None:
+            QCoreApplication.instance().aboutToQuit.connect(self.close)
+
+    def send(self, *command):
+        try:
+            self.commands.send(command)
+        except OSError as e:
+            print(f"Hardware process is not reachable: {e}")
+
+    @Slot()
+    def read_events(self):
+        """Handles every message that is waiting on the events pipe."""
+        while self.events.poll():
+            try:
+                kind, *args = self.events.recv()
+            except EOFError:
+                self.hardware_process_exited()
+                return
+            if kind == "coins":
+                self.publish_coins()
+            elif kind == "ready":
+                stand_in = RemoteAlcoholSensor(self) if args[0] == ALCOHOL_SENSOR else RemoteCoinAcceptor(self)
+                self.futures[args[0]].set_result(stand_in)
+            elif kind == "failed":
+                self.futures[args[0]].set_exception(RuntimeError(args[1]))
+
+    def publish_coins(self):
+        events, self.coins_seen = self.coins.read_since(self.coins_seen)
+        for event in events:
+            self.CoinAcceptedSignal.emit(int(event['value']), int(event['t_ns']))
+
+    def hardware_process_exited(self):
+        self.notifier.setEnabled(False)
+        print(f"Hardware process exited with code {self.process.exitcode}")
+        for name, future in self.futures.items():
+            if not future.done():
+                future.set_exception(RuntimeError("hardware process exited"))
+
+    @Slot()
+    def close(self):
+        """Stops the hardware process and removes the shared memory."""
+        self.notifier.setEnabled(False)
+        self.commands.close()  # The process exits when its command pipe closes
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.samples.close()
+        self.coins.close()
+
+class RemoteAlcoholSensor:
+    """Stands in for the AlcoholSensor of the hardware process."""
+    def __init__(self, client):
+        self.client = client
+        self.samples = client.samples
+
+    def set_acquisition_profile(self, profile):
+        self.client.send("profile", profile)
+
+    def run(self):
+        pass  # The measurement loop runs in the hardware process
+
+    def get_alcohol_level(self):
+        latest = self.samples.latest()
+        return float(latest['voltage']) if latest is not None else 0
+
+    def get_samples(self, seconds=None):
+        return self.samples.window(seconds) if seconds is not None else self.samples.snapshot()
+
+class RemoteCoinAcceptor:
+    """Stands in for the coin acceptor of the hardware process, credits arrive through CoinAcceptedSignal."""
+    def __init__(self, client):
+        self.client = client
+        self.CoinAcceptedSignal = client.CoinAcceptedSignal
+
+    def get_coin_type(self):
+        self.client.send("start_coins")  # Polling runs in the hardware process
+
+    def get_credit(self):
+        return 0
+
+    def set_credit(self, amount):
+        pass
+
+def busy_gui_thread(seconds):
+    """Pure Python work holding the GIL most of the time, like the GUI thread while it lays out and decodes."""
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sum(i * i for i in range(20000))
+
+def benchmark(seconds=5, profile="AlcoholCheck"):
+    """
+    Sample timestamp jitter of the simulated sensor while this thread is busy, with
+    the sensor running in a thread of this process and in the hardware process.
+    """
+    from sensorReadout.SimulatedAlcoholSensor import SimulatedAlcoholSensor
+    app = QCoreApplication.instance() or QCoreApplication([])
+
+    sensor = SimulatedAlcoholSensor()
+    sensor.set_acquisition_profile(profile)
+    threading.Thread(target=sensor.run, daemon=True).start()
+    started_ns = time.monotonic_ns()
+    busy_gui_thread(seconds)
+    print(f"Thread mode: {timestamp_jitter(sensor.samples.window(since_ns=started_ns))}")
+
+    client = HardwareProcessClient("simulated")
+    while not client.futures[ALCOHOL_SENSOR].done():
+        app.processEvents()
+        time.sleep(0.01)
+    client.futures[ALCOHOL_SENSOR].result().set_acquisition_profile(profile)
+    time.sleep(0.5)  # Let the new rate take effect
+    started_ns = time.monotonic_ns()
+    busy_gui_thread(seconds)
+    print(f"Process mode: {timestamp_jitter(client.samples.window(since_ns=started_ns))}")
+    client.close()
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,127 @@
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+
+# One ADS1115 sample: monotonic timestamp, raw conversion result and voltage
+SAMPLE_DTYPE = np.dtype([('t_ns', '<i8'), ('raw', '<i4'), ('voltage', '<f4')])
+
+class SampleRingBuffer:
+    """
+    Fixed-size NumPy ring of timestamped sensor samples.
+
+    The acquisition thread appends, consumers take snapshots or time windows which are
+    returned as copies in chronological order, so they can be processed without locking.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.samples = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.total = 0  # Samples appended since creation, the write position is total % capacity
+        self.lock = threading.Lock()
+
+    def append(self, t_ns, raw, voltage):
+        with self.lock:
+            self.samples[self.total % self.capacity] = (t_ns, raw, voltage)
+            self.total += 1
+
+    def latest(self):
+        """Returns the newest sample or None if nothing was recorded yet."""
+        with self.lock:
+            if self.total == 0:
+                return None
+            return self.samples[(self.total - 1) % self.capacity].copy()
+
+    def snapshot(self):
+        """Returns all buffered samples, oldest first."""
+        with self.lock:
+            count = min(self.total, self.capacity)
+            start = (self.total - count) % self.capacity
+            return np.roll(self.samples, -start)[:count] if start else self.samples[:count].copy()
+
+    def window(self, seconds=None, since_ns=None):
+        """
+        Returns the samples of the last `seconds` (relative to the newest sample) or
+        all samples taken at or after the monotonic timestamp `since_ns`, oldest first.
+        """
+        samples = self.snapshot()
+        if len(samples) == 0:
+            return samples
+        if seconds is not None:
+            since_ns = samples['t_ns'][-1] - int(seconds * 1e9)
+        if since_ns is None:
+            return samples
+        return samples[np.searchsorted(samples['t_ns'], since_ns):]
+
+    def __len__(self):
+        with self.lock:
+            return min(self.total, self.capacity)
+
+
+class SharedSampleRing(SampleRingBuffer):
+    """
+    SampleRingBuffer in a multiprocessing.shared_memory block, so a writer in another
+    process and the readers in this one use the same ring. The block starts with the
+    total as int64, followed by the records. `lock` must be a multiprocessing lock
+    shared by both processes. Without `name` a new block is created and owned (unlinked
+    by close()), otherwise the existing block is attached.
+    """
+    HEADER_SIZE = 8
+
+    def __init__(self, capacity, lock, name=None, dtype=SAMPLE_DTYPE):
+        self.capacity = capacity
+        self.lock = lock
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=self.HEADER_SIZE + capacity * dtype.itemsize)
+        self.header = np.ndarray(1, dtype=np.int64, buffer=self.shm.buf)
+        self.samples = np.ndarray(capacity, dtype=dtype, buffer=self.shm.buf, offset=self.HEADER_SIZE)
+        if self.owner:
+            self.header[0] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def total(self):
+        return int(self.header[0])
+
+    @total.setter
+    def total(self, value):
+        self.header[0] = value
+
+    def append(self, *values):
+        with self.lock:
+            total = self.total
+            self.samples[total % self.capacity] = values
+            self.total = total + 1
+
+    def read_since(self, count):
+        """
+        Returns the records appended after the first `count` ones, oldest first (at
+        most the last `capacity`, older ones were overwritten), and the new total.
+        """
+        with self.lock:
+            total = self.total
+            new = min(total - count, self.capacity)
+            return self.samples[np.arange(total - new, total) % self.capacity], total
+
+    def close(self):
+        """Detaches from the block, the owner also removes it."""
+        del self.header, self.samples
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def timestamp_jitter(samples):
+    """
+    Returns how regular the timestamps of consecutive samples (oldest first, all taken
+    at one rate) are: the median interval and the deviation of the intervals from it,
+    in ms. None with fewer than three samples.
+    """
+    if len(samples) < 3:
+        return None
+    intervals = np.diff(samples['t_ns']) / 1e6
+    median = np.median(intervals)
+    deviation = np.abs(intervals - median)
+    p50, p99 = np.percentile(deviation, [50, 99])
+    return dict(samples=len(samples), interval_ms=round(float(median), 3), p50_ms=round(float(p50), 3),
+                p99_ms=round(float(p99), 3), max_ms=round(float(deviation.max()), 3))
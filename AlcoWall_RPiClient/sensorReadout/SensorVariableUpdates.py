@@ -1,48 +1,182 @@
 import platform
 import json
 import threading
+import time
 import requests
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from PySide6.QtCore import QTimer
 from Components.AlcoWall import AlcoWall
+from DatabaseManagement.TransferScheduler import TransferScheduler, TELEMETRY
 import os
-from Constants.GENERALCONSTANTS import TARGET_PLATFORM_ARCHITECTURE, TARGET_PLATFORM_SYSTEM, DEVICE_ID
-from PySide6.QtCore import Slot
+from Constants.GENERALCONSTANTS import TARGET_PLATFORM_ARCHITECTURE, TARGET_PLATFORM_SYSTEM, DEVICE_ID, HARDWARE_BACKEND
+from Constants.GENERALCONSTANTS import COIN_ACCEPTANCE_REQUIRED_PERIPHERALS, HARDWARE_PROCESS_MODE, TRANSFER_REQUEST_TIMEOUT
+from sensorReadout.HardwareProcess import HardwareProcessClient, hardware_factories, ALCOHOL_SENSOR, COIN_ACCEPTOR
+from sensorReadout.SampleRingBuffer import timestamp_jitter
+from PySide6.QtCore import Slot, Signal
 from PySide6.QtCore import QObject
 alcoWall = AlcoWall()
 
 class SensorVariableUpdates(QObject):
+    # Emitted from the initialization threads, delivered on the GUI thread
+    peripheral_ready = Signal(str)
+    peripheral_failed = Signal(str, str)  # name, error
+
     def __init__(self):
         super().__init__()
         self.alcoholSensor = None
         self.coin_insertions = []
         self.coinAcceptor = None
+        self.coin_thread = None
+        self.peripherals = {}  # name -> future of the initialized peripheral
+        self.hardware_process = None
+        self.profile = None
+        self.profile_started_ns = time.monotonic_ns()
+        self.credit_latencies = deque(maxlen=1000)  # Seconds from the coin poll to the credit on screen
 
         # Start a new thread to handle sensor updates and network requests
         self.thread = threading.Thread(target=self.run_sensor_updates, daemon=True)
         self.thread.start()
 
-        # Check if the code is running on Raspberry Pi
-        if platform.system() == TARGET_PLATFORM_SYSTEM and TARGET_PLATFORM_ARCHITECTURE in platform.machine():
-            from sensorReadout.AlcoholSensor import AlcoholSensor
-            self.alcoholSensor = AlcoholSensor()
+        backend = self.select_backend()
+        if backend and HARDWARE_PROCESS_MODE:
+            print(f"Using {backend} sensor and coin acceptor backends in the hardware process")
+            self.hardware_process = HardwareProcessClient(backend)
+            self.track_peripherals(self.hardware_process.futures)
+        elif backend:
+            print(f"Using {backend} sensor and coin acceptor backends")
+            self.start_peripherals(hardware_factories(backend))
+
+    def start_peripherals(self, factories):
+        """
+        Initializes all peripherals concurrently off the GUI thread, so a missing or slow
+        device never delays the UI.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(factories), thread_name_prefix="peripheral-init")
+        self.track_peripherals({name: executor.submit(self.initialize_peripheral, name, factory)
+                                for name, factory in factories.items()})
+        executor.shutdown(wait=False)
+
+    def track_peripherals(self, futures):
+        """Wires up every peripheral when its future completes."""
+        self.peripheral_ready.connect(self.on_peripheral_ready)
+        self.peripheral_failed.connect(self.on_peripheral_failed)
+        alcoWall.expect_peripherals(futures)
+        for name, future in futures.items():
+            self.peripherals[name] = future
+            future.add_done_callback(lambda future, name=name: self.peripheral_initialized(name, future))
+
+    def initialize_peripheral(self, name, factory):
+        started = time.monotonic()
+        peripheral = factory()
+        print(f"{name} initialized in {time.monotonic() - started:.2f} s")
+        return peripheral
+
+    def peripheral_initialized(self, name, future):
+        """Runs on the initialization thread, or on the GUI thread in hardware process mode."""
+        error = future.exception()
+        if error is None:
+            self.peripheral_ready.emit(name)
+        else:
+            self.peripheral_failed.emit(name, str(error))
+
+    @Slot(str)
+    def on_peripheral_ready(self, name):
+        peripheral = self.peripherals[name].result()
+        if name == ALCOHOL_SENSOR:
+            self.alcoholSensor = peripheral
+            alcoWall.set_alcohol_samples(self.alcoholSensor.samples)
+            alcoWall.state_changed.connect(self.on_state_changed)
+            if alcoWall.current_state is not None:
+                self.profile = type(alcoWall.current_state).__name__
+                self.alcoholSensor.set_acquisition_profile(self.profile)
             self.alcoholSensorThread = threading.Thread(target=self.alcoholSensor.run, daemon=True)
             self.alcoholSensorThread.start()
-
-            from sensorReadout.CoinAcceptor_New import CoinAcceptor
-            self.coinAcceptor = CoinAcceptor()
+        elif name == COIN_ACCEPTOR:
+            self.coinAcceptor = peripheral
             self.coinAcceptor.CoinAcceptedSignal.connect(self.update_credit)
-            self.coin_thread = threading.Thread(target=self.coinAcceptor.get_coin_type, daemon=True)
-            self.coin_thread.start()
+        alcoWall.set_peripheral_ready(name)
+        self.start_accepting_coins()
+
+    @Slot(str, str)
+    def on_peripheral_failed(self, name, error):
+        print(f"Failed to initialize {name}: {error}")
+
+    def start_accepting_coins(self):
+        """Starts coin polling, which enables the validator, once the peripherals a session needs are ready."""
+        if self.coinAcceptor is None or self.coin_thread is not None:
+            return
+        missing = alcoWall.missing_peripherals(COIN_ACCEPTANCE_REQUIRED_PERIPHERALS)
+        if missing:
+            print(f"Coin acceptance waits for {', '.join(missing)}")
+            return
+        self.coin_thread = threading.Thread(target=self.coinAcceptor.get_coin_type, daemon=True)
+        self.coin_thread.start()
+
+    def get_peripheral_status(self):
+        """Returns "initializing", "ready" or "failed" per peripheral."""
+        status = {}
+        for name, future in self.peripherals.items():
+            if not future.done():
+                status[name] = "initializing"
+            else:
+                status[name] = "failed" if future.exception() else "ready"
+        return status
+
+    def select_backend(self):
+        """Returns "hardware", "simulated" or None (no sensor and coin acceptor) from HARDWARE_BACKEND."""
+        if HARDWARE_BACKEND == "auto":
+            # Check if the code is running on Raspberry Pi
+            if platform.system() == TARGET_PLATFORM_SYSTEM and TARGET_PLATFORM_ARCHITECTURE in platform.machine():
+                return "hardware"
+            return None
+        if HARDWARE_BACKEND in ("hardware", "simulated"):
+            return HARDWARE_BACKEND
+        print(f"Unknown HARDWARE_BACKEND {HARDWARE_BACKEND}, running without sensor and coin acceptor")
+        return None
 
     def run_sensor_updates(self):
         while True:
             self.check_variable_updates()
             threading.Event().wait(1)
     
-    @Slot(int)
-    def update_credit(self, credit):
-            alcoWall.update_credit(credit)
+    @Slot(str)
+    def on_state_changed(self, state_name):
+        """Sample the alcohol sensor at the rate the new state needs."""
+        if self.alcoholSensor:
+            print(f"Sample timestamp jitter during {self.profile}: {self.get_sample_jitter_stats()}")
+            self.alcoholSensor.set_acquisition_profile(state_name)
+            self.profile = state_name
+            self.profile_started_ns = time.monotonic_ns()
+
+    def get_sample_jitter_stats(self):
+        """
+        Returns how regularly the alcohol sensor was sampled since the last profile
+        switch (see timestamp_jitter), whether it runs in a thread or in the hardware process.
+        """
+        samples = alcoWall.get_alcohol_window(since_ns=self.profile_started_ns)
+        stats = timestamp_jitter(samples) if samples is not None else None
+        if stats:
+            stats["mode"] = "process" if self.hardware_process else "thread"
+        return stats
+
+    @Slot(int, object)
+    def update_credit(self, credit, timestamp_ns):
+        alcoWall.update_credit(credit)
+        latency = (time.monotonic_ns() - timestamp_ns) / 1e9
+        self.credit_latencies.append(latency)
+        print(f"Credit {credit} shown {latency * 1000:.1f} ms after the coin was reported")
+
+    def get_credit_latency_stats(self):
+        """Returns credit latency percentiles in ms and the coin acceptor poll statistics."""
+        latencies = np.array(self.credit_latencies) * 1000
+        stats = {"coin_acceptor": self.coinAcceptor.get_coin_stats() if hasattr(self.coinAcceptor, "get_coin_stats") else None}
+        if len(latencies):
+            p50, p99 = np.percentile(latencies, [50, 99])
+            stats.update(count=len(latencies), p50_ms=round(p50, 2), p99_ms=round(p99, 2), max_ms=round(latencies.max(), 2))
+        return stats
 
     def check_variable_updates(self):
         if self.coinAcceptor and self.coinAcceptor.get_credit() > 0:
@@ -116,7 +250,10 @@ class SensorVariableUpdates(QObject):
     def send_coin_insertions_to_database(self, credit):
         success = False
         try:
-            response = requests.post("https://node.alkowall.indigoingenium.ba/cash/add_cash_multiple", json=self.coin_insertions)
+            # Cash reports have the highest priority on the uplink
+            with TransferScheduler().transfer(TELEMETRY):
+                response = requests.post("https://node.alkowall.indigoingenium.ba/cash/add_cash_multiple", json=self.coin_insertions,
+                                         timeout=TRANSFER_REQUEST_TIMEOUT)
             if response.status_code == 200:
                 response_data = response.json()
                 if response_data.get("message") == "Cash status updated successfully for multiple devices.":
@@ -0,0 +1,81 @@
+import itertools
+import random
+import time
+import numpy as np
+from sensorReadout.AlcoholSensor import AlcoholSensor, PGA_FULL_SCALE_VOLTAGE
+from Constants.GENERALCONSTANTS import ALCOHOL_SENSOR_GAIN, SIMULATED_SENSOR_BASELINE, SIMULATED_SENSOR_NOISE
+from Constants.GENERALCONSTANTS import SIMULATED_BREATH_PEAKS, SIMULATED_SENSOR_TRACES
+
+BREATH_PROFILE = "AlcoholCheck"  # A customer blows into the sensor while the device is in this state
+
+class SimulatedAlcoholSensor(AlcoholSensor):
+    """
+    AlcoholSensor without hardware. Every time the acquisition profile switches to
+    AlcoholCheck a breath starts: either a synthetic MQ-3 curve (exponential rise while
+    blowing, slow recovery that takes longer after high readings) with a peak picked
+    from `peaks`, or the next recorded trace replayed relative to its first sample.
+    Everything else (sampling loop, ring buffer, profiles, stats) is the real code.
+    """
+    def __init__(self, baseline=SIMULATED_SENSOR_BASELINE, noise=SIMULATED_SENSOR_NOISE,
+                 peaks=SIMULATED_BREATH_PEAKS, traces=SIMULATED_SENSOR_TRACES, seed=None, **kwargs):
+        self.baseline = baseline
+        self.noise = noise
+        self.peaks = peaks
+        self.random = random.Random(seed)
+        self.traces = [self.load_trace(path) for path in traces]
+        self.trace_cycle = itertools.cycle(self.traces) if self.traces else None
+        self.breath = None  # (start time, peak, blow seconds) or (start time, trace t, trace voltage)
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def load_trace(path):
+        """Loads a recorded trace (array with t_ns and voltage fields) as seconds and volts above its start."""
+        samples = np.load(path)
+        t = (samples['t_ns'] - samples['t_ns'][0]) / 1e9
+        voltage = samples['voltage'].astype(np.float64) - float(samples['voltage'][0])
+        return t, voltage
+
+    def _initialize_sensor(self):
+        self.volts_per_count = PGA_FULL_SCALE_VOLTAGE[ALCOHOL_SENSOR_GAIN] / 32767
+
+    def _reinitialize_sensor(self, reason):
+        pass
+
+    def set_acquisition_profile(self, profile):
+        if profile == BREATH_PROFILE:
+            self.start_breath()
+        super().set_acquisition_profile(profile)
+
+    def start_breath(self):
+        # The customer needs a moment to start blowing
+        start = time.monotonic() + self.random.uniform(0.5, 2.0)
+        if self.trace_cycle:
+            t, voltage = next(self.trace_cycle)
+            self.breath = ("trace", start, t, voltage)
+        else:
+            self.breath = ("synthetic", start, self.random.choice(self.peaks), self.random.uniform(2.5, 4.0))
+
+    def breath_voltage(self, now):
+        """Voltage above baseline caused by the current breath."""
+        if self.breath is None or now < self.breath[1]:
+            return 0.0
+        elapsed = now - self.breath[1]
+        if self.breath[0] == "trace":
+            _, _, t, voltage = self.breath
+            return float(np.interp(elapsed, t, voltage))
+
+        _, _, peak, blow_seconds = self.breath
+        rise = peak * (1 - np.exp(-3 * min(elapsed, blow_seconds) / blow_seconds))
+        if elapsed <= blow_seconds:
+            return rise
+        recovery_seconds = 3 + 15 * peak  # The sensor takes longer to clear after a high reading
+        return rise * np.exp(-(elapsed - blow_seconds) / recovery_seconds)
+
+    def read_raw(self):
+        voltage = self.baseline + self.breath_voltage(time.monotonic()) + self.random.gauss(0, self.noise)
+        return int(max(-32768, min(32767, round(voltage / self.volts_per_count))))
+
+if __name__ == "__main__":
+    sensor = SimulatedAlcoholSensor(seed=1)
+    sensor.set_acquisition_profile(BREATH_PROFILE)
+    sensor.run()
@@ -0,0 +1,65 @@
+import itertools
+import threading
+import time
+from PySide6.QtCore import QObject, Signal
+from Constants.GENERALCONSTANTS import SIMULATED_COIN_SCRIPT
+
+class SimulatedCoinAcceptor(QObject):
+    """
+    Coin acceptor without hardware, with the interface of CoinAcceptor_New.CoinAcceptor.
+    get_coin_type() plays `script`, a sequence of (seconds after the previous event,
+    coin value), in a loop. Coins inserted while all coins are rejected are dropped,
+    like a validator with master inhibit set would do.
+    """
+    CoinAcceptedSignal = Signal(int, object)  # coin value, monotonic ns the coin was accepted
+
+    def __init__(self, script=SIMULATED_COIN_SCRIPT):
+        super().__init__()
+        self.script = script
+        self.accepting = False
+        self.credit = 0
+        self.credit_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def reject_all_coins(self):
+        self.accepting = False
+        print("Simulated coin acceptor is now rejecting all coins.")
+
+    def accept_all_coins(self):
+        self.accepting = True
+        print("Simulated coin acceptor is now accepting all coins.")
+
+    def get_credit(self):
+        with self.credit_lock:
+            return self.credit
+
+    def update_credit(self, amount):
+        with self.credit_lock:
+            self.credit += amount
+            print(f"Credit updated by {amount}, total is now {self.credit}")
+
+    def set_credit(self, amount):
+        with self.credit_lock:
+            self.credit = amount
+
+    def insert_coin(self, coin_value):
+        """Simulates a customer inserting a coin."""
+        if not self.accepting:
+            print(f"Simulated coin rejected: Value {coin_value}")
+            return
+        print(f"Coin accepted: Value {coin_value} (simulated)")
+        self.CoinAcceptedSignal.emit(coin_value, time.monotonic_ns())
+
+    def get_coin_type(self):
+        """Plays the coin script until stop() is called."""
+        self.accept_all_coins()
+        print("Simulated coin validator enabled.")
+        if not self.script:
+            return
+        for delay, coin_value in itertools.cycle(self.script):
+            if self.stop_event.wait(delay):
+                return
+            self.insert_coin(coin_value)
+
+    def stop(self):
+        self.stop_event.set()